@@ -8,29 +8,20 @@
 
 
 # python packages
-from math import log2
-from operator import attrgetter
-from collections import OrderedDict, Counter
-
-
-########################################################################################################################
-
-
-# doc object
-class Doc(object):
-
-    def __init__(self, doc_id, doc_vec, doc_term_id, doc_term_freq, doc_len):
-
-        # document id
-        self.doc_id = doc_id
-        # document vector
-        self.doc_vec = doc_vec
-        # document term id
-        self.doc_term_id = doc_term_id
-        # document term frequency
-        self.doc_term_freq = doc_term_freq
-        # document length
-        self.doc_len = doc_len
+import argparse
+from contextlib import ExitStack
+from multiprocessing import get_context
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from itertools import islice
+from numpy import arange, argpartition, asarray, diff, flatnonzero, float64, isin, lexsort, ones, repeat, zeros
+from scipy.sparse import csr_matrix
+
+# local packages
+from DocLoader import load_doc_store
+from CollectionStats import get_collection_stats
+from InvertedIndex import build_index
+from RunWriter import RunWriter
 
 
 ########################################################################################################################
@@ -70,65 +61,6 @@ class Result(object):
 ########################################################################################################################
 
 
-# loads documents
-def load_docs(input_file):
-
-    # list to hold unique docs
-    unique_doc_ids = []
-    # list to hold document term ids
-    doc_term_ids = []
-    # list to hold data
-    data = []
-    # variable to hold documents length
-    docs_len = 0
-
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # if document id is not in unique docs
-            if line.split(' ')[0] not in unique_doc_ids:
-                # add document id to unique documents list
-                unique_doc_ids += [line.split(' ')[0]]
-                # split line into tokens
-                tokens = line.strip(' \n').split(' ')
-                # assign first token to document id
-                doc_id = tokens[0]
-                # list to hold document term id
-                doc_term_id = []
-                # list to hold document term frequency
-                doc_term_freq = []
-                # variable to hold document length
-                doc_len = 0
-                # list to hold temporary document vector
-                doc_vec_temp = []
-                # for every token except the first one
-                for token in tokens[1:]:
-                    # split token
-                    token = token.split(':')
-                    # add first token to document term ids
-                    doc_term_ids += [int(token[0])]
-                    # add first token to document term id
-                    doc_term_id += [token[0]]
-                    # add second token to document term frequency
-                    doc_term_freq += [token[1]]
-                    # add second token to document length
-                    doc_len += int(token[1])
-                    # add first and second token to temporary document vector
-                    doc_vec_temp += [(token[0], int(token[1]))]
-                # add document length to documents length
-                docs_len += doc_len
-                """ add document id, document vector, document term id, document term
-                    frequency and document length as attributes of the Doc object """
-                data += [Doc(doc_id, doc_vec_temp, doc_term_id, doc_term_freq, doc_len)]
-
-    # return data, document term ids and documents length
-    return data, doc_term_ids, docs_len
-
-
-########################################################################################################################
-
-
 # loads queries
 def load_queries(input_file):
 
@@ -192,78 +124,322 @@ def get_fqid(query_term_id, doc_vec):
 ########################################################################################################################
 
 
-# calculates bm25 score
-def calc_bm25(docs, doc_freq, docs_len, N, query_id, query_term_ids, k1, b):
+# calculates bm25 score of a single query term qi for a single document
+# length_norm - the document's (1 - b + b * doc_len / avg_doc_len), cached per b by the inverted index
+def calc_bm25_term(idfqi, fqid, length_norm, k1):
 
-    # list to hold data
-    data = []
+    # calculate fraction part
+    fraction = (fqid * (k1 + 1)) / (fqid + k1 * length_norm)
+
+    # return bm25 score for current document and current query term qi
+    return idfqi * fraction
+
+
+########################################################################################################################
+
+
+# ranks the k highest scoring documents of a query, exactly as a full-collection sort would, from the scores of the
+# documents touched by its postings - positive scores first, then documents scoring 0.0, touched or not, in collection
+# order, then negative scores. Documents scoring 0.0 are taken lazily, so only as many untouched documents are visited
+# as the top k needs
+#
+# positive      - (document index, document score) of every document scoring above 0.0, sorted by descending score
+# doc_scores    - document index -> document score, of every touched document
+def rank_results(index, query_id, positive, doc_scores, k):
+
+    # variable to hold number of documents to retrieve
+    depth = max(min(k, index.N), 0)
+
+    # take positive scores first
+    ranked = positive[:depth]
+    # then documents scoring 0.0, in collection order, until k documents are ranked
+    zero = (x for x in range(index.N) if doc_scores.get(x, 0.0) == 0.0)
+    ranked += [(x, 0.0) for x in islice(zero, depth - len(ranked))]
+    # then negative scores, sorted by descending score, ties broken by collection order
+    if len(ranked) < depth:
+        negative = sorted([x for x in doc_scores.items() if x[1] < 0.0], key=lambda x: (-x[1], x[0]))
+        ranked += negative[:depth - len(ranked)]
+
+    """ add query id, document id and document score as attributes of
+        the Result object """
+    data = [Result(query_id, index.doc_ids[doc_index], doc_score) for doc_index, doc_score in ranked]
+
+    # return data
+    return data
+
+
+########################################################################################################################
+
+
+# calculates upper bound of a query term's bm25 score over all documents in its postings
+def calc_term_upper_bound(index, term_id, idfqi, length_norms, k1, b):
+
+    # key of upper bound in index cache - upper bounds only depend on the term and free parameters
+    key = (term_id, k1, b)
 
-    # calculate average document length
-    avg_doc_len = docs_len / N
-
-    # variable to hold print progress set to 0
-    print_progress = 0
-    # for every document
-    for doc in docs:
-        # variable to hold document id
-        doc_id = doc.doc_id
-        # variable to hold document vector
-        doc_vec = OrderedDict(doc.doc_vec)
-        # variable to hold document length
-        doc_len = doc.doc_len
-
-        # variable to hold document score
+    # if upper bound has not been calculated yet
+    if key not in index.upper_bounds:
+        # get postings of term id
+        doc_indexes, term_freqs = index.postings[term_id]
+        # calculate highest bm25 score of the term across its postings
+        index.upper_bounds[key] = max(calc_bm25_term(idfqi, fqid, length_norms[doc_index], k1)
+                                      for doc_index, fqid in zip(doc_indexes, term_freqs))
+
+    # return upper bound, documents missing the term score 0.0 for it so the bound is never below 0.0
+    return max(index.upper_bounds[key], 0.0)
+
+
+########################################################################################################################
+
+
+# calculates bm25 score of the k highest scoring documents, skipping documents that cannot enter the top k (MaxScore)
+def calc_bm25_top_k(index, query_id, query_term_ids, k1, b, k):
+
+    # if no documents are retrieved, there is nothing to score
+    if k < 1:
+        return []
+
+    # variable to hold number of documents in the collection
+    N = index.N
+    # get length normalisation of every document for free parameter b
+    length_norms = index.length_norms(b)
+
+    # list to hold query terms as (query term position, idfqi, upper bound, document indexes, term frequencies)
+    terms = []
+    # for every query term position and query term id
+    for position, query_term_id in enumerate(query_term_ids):
+        # get postings of current query term qi
+        postings = index.postings.get(int(query_term_id))
+        # if current query term qi does not appear in the collection, it adds nothing to any document score
+        if postings is None:
+            continue
+        # get idfqi, precomputed from nqi
+        idfqi = index.idf[int(query_term_id)]
+        # calculate upper bound of current query term qi
+        upper_bound = calc_term_upper_bound(index, int(query_term_id), idfqi, length_norms, k1, b)
+        # add query term to terms
+        terms += [(position, idfqi, upper_bound, postings[0], postings[1])]
+
+    # sort terms by ascending upper bound
+    terms = sorted(terms, key=lambda x: x[2])
+    # list to hold cumulative upper bounds, cum_upper_bounds[i] - sum of upper bounds of terms 0..i
+    cum_upper_bounds = []
+    # variable to hold running sum of upper bounds
+    running_upper_bound = 0.0
+    # for every term
+    for term in terms:
+        # add term upper bound to running sum
+        running_upper_bound += term[2]
+        # add running sum to cumulative upper bounds
+        cum_upper_bounds += [running_upper_bound]
+
+    # variable to hold slack, which keeps float rounding in summation order from pruning a document it should not
+    slack = 1e-9
+
+    # min-heap of (document score, -document index) holding the current top k
+    heap = []
+    # variable to hold score threshold a document must beat to enter the top k
+    threshold = 0.0
+    # variable to hold index of first essential term, terms before it cannot lift a document into the top k alone
+    first_essential = 0
+    # list to hold postings cursors of every term
+    cursors = [0 for _ in terms]
+    # variable to hold number of fully scored documents
+    scored = 0
+    # dictionary to hold document index -> document score, of fully scored documents scoring 0.0 or less
+    non_positive = {}
+
+    # while there is an essential term
+    while first_essential < len(terms):
+        # get next candidate document, the smallest document index under an essential term cursor
+        doc_index = min((terms[i][3][cursors[i]] for i in range(first_essential, len(terms))
+                         if cursors[i] < len(terms[i][3])), default=None)
+        # if every essential postings list is exhausted
+        if doc_index is None:
+            break
+
+        # dictionary to hold query term position -> bm25 score of the candidate document
+        contributions = {}
+        # variable to hold partial document score
+        partial_score = 0.0
+        # variable to hold document length normalisation
+        length_norm = length_norms[doc_index]
+
+        # for every essential term
+        for i in range(first_essential, len(terms)):
+            # get term
+            position, idfqi, _, doc_indexes, term_freqs = terms[i]
+            # if term cursor points at the candidate document
+            if cursors[i] < len(doc_indexes) and doc_indexes[cursors[i]] == doc_index:
+                # calculate bm25 score for current document and current query term qi
+                contributions[position] = calc_bm25_term(idfqi, term_freqs[cursors[i]], length_norm, k1)
+                # add it to partial score
+                partial_score += contributions[position]
+                # advance term cursor
+                cursors[i] += 1
+
+        # variable to hold whether candidate document was pruned
+        pruned = False
+        # for every non-essential term, from highest upper bound down
+        for i in range(first_essential - 1, -1, -1):
+            # if candidate document cannot enter the top k even with the remaining upper bounds
+            if len(heap) == k and partial_score + cum_upper_bounds[i] + slack < threshold:
+                # prune candidate document
+                pruned = True
+                break
+            # get term
+            position, idfqi, _, doc_indexes, term_freqs = terms[i]
+            # advance term cursor to the candidate document
+            cursors[i] = bisect_left(doc_indexes, doc_index, cursors[i])
+            # if term postings contain the candidate document
+            if cursors[i] < len(doc_indexes) and doc_indexes[cursors[i]] == doc_index:
+                # calculate bm25 score for current document and current query term qi
+                contributions[position] = calc_bm25_term(idfqi, term_freqs[cursors[i]], length_norm, k1)
+                # add it to partial score
+                partial_score += contributions[position]
+
+        # if candidate document was pruned
+        if pruned:
+            continue
+
+        # calculate document score in query term order, so it does not depend on the order terms were visited in
         doc_score = 0.0
-        # for every query term id
-        for query_term_id in query_term_ids:
+        for position in sorted(contributions):
+            doc_score += contributions[position]
+        # increment scored documents
+        scored += 1
+
+        # documents scoring 0.0 or less compete with the untouched documents and are ranked by rank_results below
+        if doc_score <= 0.0:
+            non_positive[doc_index] = doc_score
+            continue
+        # if heap is not full
+        if len(heap) < k:
+            # add document to heap
+            heappush(heap, (doc_score, -doc_index))
+        # else if document beats the lowest document in the heap, ties broken by collection order
+        elif (doc_score, -doc_index) > heap[0]:
+            # replace lowest document in the heap
+            heapreplace(heap, (doc_score, -doc_index))
+        # if heap is full
+        if len(heap) == k:
+            # update threshold
+            threshold = heap[0][0]
+            # move terms whose cumulative upper bound cannot reach the threshold to the non-essential set
+            while first_essential < len(terms) and cum_upper_bounds[first_essential] + slack < threshold:
+                first_essential += 1
+
+    # print progress
+    print('query id {} - scored {} out of {} documents'.format(query_id, scored, N))
+
+    # sort heap by descending score, ties broken by collection order
+    ranked = sorted(heap, reverse=True)
+
+    # if fewer than k documents scored above 0.0, nothing was pruned, so every touched document was scored - fill the
+    # top k with 0.0 and negative scores
+    if len(heap) < k:
+        positive = [(-neg_doc_index, doc_score) for doc_score, neg_doc_index in ranked]
+        # get score of every touched document
+        doc_scores = dict(positive)
+        doc_scores.update(non_positive)
+        return rank_results(index, query_id, positive, doc_scores, k)
+
+    """ add query id, document id and document score as attributes of
+        the Result object """
+    data = [Result(query_id, index.doc_ids[-neg_doc_index], doc_score) for doc_score, neg_doc_index in ranked]
 
-            # k1, b - free parameters
-            # doc_len - current document's length
-            # avg_doc_len - average document length
-            # N - total number of documents in the collection
-            # nqi - number of documents containing current query term qi
-            # fqid - current query term qi's term frequency in document D
-            # idfqi - inverse document frequency weight of the current query term qi
+    # return data
+    return data
 
-            # get nqi
-            nqi = doc_freq.get(int(query_term_id))
-            # get fqid
-            fqid = doc_vec.get(query_term_id, 0)
 
-            # calculate idfqi
-            idfqi = log2((N - nqi + 0.5) / (nqi + 0.5))
-            # calculate fraction part
-            fraction = (fqid * (k1 + 1)) / (fqid + k1 * (1 - b + b * doc_len / avg_doc_len))
+########################################################################################################################
 
-            # calculate bm25 score for current document and current query term qi
-            bm25_score = idfqi * fraction
 
-            # add current query term qi's bm25 score to overall document score
-            doc_score += bm25_score
+# calculates bm25 score of the k highest scoring documents for all queries at once, with one sparse matrix product
+def calc_bm25_batch(store, stats, queries, k1, b, k):
+
+    # variable to hold number of documents in the collection
+    N = store.N
+    # get average document length
+    avg_doc_len = stats.avg_doc_len
+
+    # list to hold term ids of every query, as ints
+    query_term_ids = [[int(x) for x in query.query_term_id] for query in queries]
+    # variable to hold size of the term id space
+    num_terms = max([int(store.term_ids.max()) if len(store.term_ids) else 0] +
+                    [x for term_ids in query_term_ids for x in term_ids]) + 1
+
+    # get idfqi of every term id, precomputed from nqi
+    idf = zeros(num_terms)
+    idf[stats.term_ids] = stats.bm25_idf
+    # precompute length normalisation of every document
+    length_norm = k1 * (1 - b + b * store.doc_lens / avg_doc_len)
+
+    # keep only term occurrences of query terms, the rest cannot contribute to any score
+    mask = isin(store.term_ids, list({x for term_ids in query_term_ids for x in term_ids}))
+    doc_indexes = repeat(arange(N), diff(store.offsets))[mask]
+    term_ids = asarray(store.term_ids)[mask]
+    fqid = asarray(store.term_freqs)[mask].astype(float64)
+
+    # document-term matrix of bm25 term scores, documents x terms
+    doc_term = csr_matrix((idf[term_ids] * ((fqid * (k1 + 1)) / (fqid + length_norm[doc_indexes])),
+                           (doc_indexes, term_ids)), shape=(N, num_terms))
+    # term-query matrix, terms x queries - a term repeated in a query counts once per occurrence
+    query_rows = [x for term_ids in query_term_ids for x in term_ids]
+    query_cols = [i for i, term_ids in enumerate(query_term_ids) for _ in term_ids]
+    term_query = csr_matrix((ones(len(query_rows)), (query_rows, query_cols)), shape=(num_terms, len(queries)))
+
+    # score every document against every query, documents x queries
+    scores = (doc_term @ term_query).toarray()
+
+    # for every query
+    for i, query in enumerate(queries):
+        # get document scores of current query
+        doc_scores = scores[:, i]
+        # variable to hold number of documents to retrieve, none when k is not positive
+        depth = max(min(k, N), 0)
+        # find the k-th highest score without sorting every document
+        threshold = doc_scores[argpartition(-doc_scores, depth - 1)[depth - 1]] if depth else 0.0
+        # every document reaching the threshold, so ties at the cut are broken by collection order
+        candidates = flatnonzero(doc_scores >= threshold)
+        # sort candidates by descending score, ties broken by collection order
+        ranked = candidates[lexsort((candidates, -doc_scores[candidates]))][:depth]
+
+        # print progress
+        print('query id {} - scored {} out of {} documents'.format(query.query_id, N, N))
 
         """ add query id, document id and document score as attributes of
             the Result object """
-        data += [Result(query_id, doc_id, doc_score)]
-        # print progress
-        print('query id {} - scored {} out of {} documents'.format(query_id, print_progress, N))
-        # increment print progress
-        print_progress += 1
+        yield [Result(query.query_id, store.doc_ids[doc_index], doc_score)
+               for doc_index, doc_score in zip(ranked.tolist(), doc_scores[ranked].tolist())]
 
-    # sort data in reverse order
-    data = sorted(data, reverse=True, key=attrgetter('doc_score'))
 
-    # return data
-    return data
+########################################################################################################################
+
+
+# inverted index shared with worker processes - set before the pool forks, so workers read it copy-on-write
+shared_index = None
+
+
+# calculates bm25 score of a single query against the shared inverted index, in a worker process
+def score_query(query_args):
+
+    # unpack query id, query term ids and free parameters
+    query_id, query_term_ids, k1, b, top_k = query_args
+
+    # return results of the query
+    return calc_bm25_top_k(shared_index, query_id, query_term_ids, k1, b, top_k)
 
 
 ########################################################################################################################
 
 
 # main function
-def main():
+def main(collection_file, top_k, batch, workers):
+
+    # inverted index shared with worker processes
+    global shared_index
 
-    # load docs
-    docs, doc_term_ids, docs_len = load_docs('input/document_term_vectors.dat')
     # load queries
     queries = load_queries('input/query_term_vectors.dat')
 
@@ -272,37 +448,44 @@ def main():
     # variable to hold free parameter k1
     k1 = 1.5
 
-    # create a counter of document term ids and assign it to document term ids counter
-    doc_term_ids_counter = Counter(doc_term_ids)
-    # get document frequency for every term, add it to an ordered dictionary and assign it to document frequency
-    doc_freq = OrderedDict([(x, doc_term_ids_counter[x]) for x in doc_term_ids])
-
-    # variable to hold number of documents in the collection
-    N = len(docs)
-
-    # for every query
-    for query in queries:
-        # variable to hold query id
-        query_id = query.query_id
-        # variable to hold query term id
-        query_term_id = query.query_term_id
-        # calculate bm25 score and return output in results
-        results = calc_bm25(docs, doc_freq, docs_len, N, query_id, query_term_id, k1, b)
-        # open file
-        with open('output/temp/bm25_b_0.75.txt', mode='a') as results_file:
-            # variable to hold document rank
-            doc_rank = 0
-            # for every result
-            for result in results:
-                # if document rank is less than 100
-                if doc_rank < 100:
-                    # write results in standard TREC format
-                    results_file.write('{} Q0 {} {} {} bm25_b_.0.75\n'.
-                                       format(result.query_id, result.doc_id, doc_rank, result.doc_score))
-                # increment document rank
-                doc_rank += 1
-        # print progress
-        print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
+    # load docs into a document store
+    store = load_doc_store(collection_file)
+    # load collection statistics, computing and persisting them on first use
+    stats = get_collection_stats(collection_file, store)
+
+    # open worker pool first, if any, so it is terminated last - after the run writer is published, or discarded if a
+    # query raised
+    with ExitStack() as stack:
+        # if batch mode
+        if batch:
+            # calculate bm25 score of all queries with one sparse matrix product
+            all_results = calc_bm25_batch(store, stats, queries, k1, b, top_k)
+        # else if more than one worker
+        elif workers > 1:
+            # build inverted index once, for all queries, and share it with the workers
+            shared_index = build_index(store, stats)
+            # fork worker processes, which inherit the index without copying or pickling it
+            pool = stack.enter_context(get_context('fork').Pool(workers))
+            # calculate bm25 score of the queries in parallel, results come back in query order
+            all_results = pool.imap(score_query, [(query.query_id, query.query_term_id, k1, b, top_k)
+                                                  for query in queries])
+        else:
+            # build inverted index once, for all queries
+            index = build_index(store, stats)
+            # calculate bm25 score query by query
+            all_results = (calc_bm25_top_k(index, query.query_id, query.query_term_id, k1, b, top_k)
+                           for query in queries)
+
+        # open run writer
+        results_file = stack.enter_context(RunWriter('output/temp/bm25_b_0.75.txt'))
+        # for every query's results
+        for results in all_results:
+            # for every document rank and result
+            for doc_rank, result in enumerate(results):
+                # write results in standard TREC format
+                results_file.write(result.query_id, result.doc_id, doc_rank, result.doc_score, 'bm25_b_.0.75')
+    # print progress
+    print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
 
 
 ########################################################################################################################
@@ -310,4 +493,25 @@ def main():
 
 # runs main function
 if __name__ == '__main__':
-    main()
+
+    # parse script arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--collection', type=str, dest='collection_', metavar='collection file',
+                        default='input/document_term_vectors.dat',
+                        help='text collection file, or binary collection file built by BuildCollection.py')
+    parser.add_argument('-k', '--top_k', type=int, dest='top_k_', metavar='top k value', default=100,
+                        help='number of documents retrieved per query')
+    parser.add_argument('--batch', action='store_true', dest='batch_',
+                        help='score all queries at once with a sparse matrix product, in one process')
+    parser.add_argument('-w', '--workers', type=int, dest='workers_', metavar='number of workers', default=1,
+                        help='number of worker processes scoring queries in parallel, not with --batch')
+    args = parser.parse_args()
+    # batch mode scores every query in one matrix product, there are no queries to share between workers
+    if args.batch_ and args.workers_ > 1:
+        parser.error('--workers cannot be combined with --batch')
+
+    # call main function with the script arguments as parameters
+    main(args.collection_, args.top_k_, args.batch_, args.workers_)
+
+
+########################################################################################################################
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Sweeps the BM25 free parameters k1 and b, loading the collection and building the inverted index once, and
+# evaluating every run in-process with NDCG
+
+########################################################################################################################
+
+
+# python packages
+import argparse
+
+# local packages
+from DocLoader import load_doc_store
+from CollectionStats import get_collection_stats
+from InvertedIndex import build_index
+from BM25Model import load_queries, calc_bm25_top_k
+from NDCG import calc_avg_ndcg
+from QrelsIndex import get_qrels
+from RunWriter import RunWriter
+
+
+########################################################################################################################
+
+
+# parses a comma separated list of floats
+def parse_floats(value):
+
+    # return list of floats
+    return [float(x) for x in value.split(',')]
+
+
+########################################################################################################################
+
+
+# main function
+def main(collection_file, k1_values, b_values, top_k, cutoffs):
+
+    # load queries
+    queries = load_queries('input/query_term_vectors.dat')
+    # load qrels index
+    qrels = get_qrels('input/qrels.adhoc.txt')
+
+    # load docs into a document store
+    store = load_doc_store(collection_file)
+    # build inverted index once, for every setting - document length normalisations are cached in it per b
+    index = build_index(store, get_collection_stats(collection_file, store))
+
+    # list to hold average ndcg of every setting
+    sweep = []
+
+    # for every value of b
+    for b in b_values:
+        # for every value of k1
+        for k1 in k1_values:
+            # list to hold run as (query id, ranked document ids)
+            run = []
+            # open run writer
+            with RunWriter('output/temp/bm25_k1_{}_b_{}.txt'.format(k1, b)) as results_file:
+                # for every query
+                for query in queries:
+                    # calculate bm25 score and return output in results
+                    results = calc_bm25_top_k(index, query.query_id, query.query_term_id, k1, b, top_k)
+                    # write results in standard TREC format
+                    results_file.write_results(query.query_id, [(x.doc_id, x.doc_score) for x in results],
+                                               'bm25_k1_{}_b_{}'.format(k1, b))
+                    # add query results to run
+                    run += [(query.query_id, [result.doc_id for result in results])]
+            # print progress
+            print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
+
+            # evaluate run with ndcg
+            sweep += [(k1, b, calc_avg_ndcg(run, qrels, cutoffs))]
+
+    # write ndcg @ k of every setting to file
+    with open('output/temp/bm25_sweep_ndcg.txt', mode='w') as results_file:
+        results_file.write('k1\t|\tb\t|\t{}\n'.format('\t|\t'.join('NDCG@{}'.format(k) for k in cutoffs)))
+        for k1, b, avg_ndcg in sweep:
+            results_file.write('{}\t|\t{}\t|\t{}\n'.format(k1, b, '\t|\t'.join('{:.3f}'.format(x) for x in avg_ndcg)))
+    # print progress
+    print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
+
+
+########################################################################################################################
+
+
+# runs main function
+if __name__ == '__main__':
+
+    # parse script arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--collection', type=str, dest='collection_', metavar='collection file',
+                        default='input/document_term_vectors.dat',
+                        help='text collection file, or binary collection file built by BuildCollection.py')
+    parser.add_argument('--k1', type=parse_floats, dest='k1_', metavar='k1 values', default=[1.2, 1.5, 2.0],
+                        help='comma separated k1 values')
+    parser.add_argument('-b', '--b', type=parse_floats, dest='b_', metavar='b values', default=[0.25, 0.5, 0.75],
+                        help='comma separated b values')
+    parser.add_argument('-k', '--top_k', type=int, dest='top_k_', metavar='top k value', default=100,
+                        help='number of documents retrieved per query')
+    parser.add_argument('--cutoffs', type=lambda x: [int(y) for y in x.split(',')], dest='cutoffs_',
+                        metavar='ndcg cutoffs', default=[1, 5, 10, 20, 30, 40, 50], help='comma separated ndcg cutoffs')
+    args = parser.parse_args()
+
+    # call main function with the script arguments as parameters
+    main(args.collection_, args.k1_, args.b_, args.top_k_, args.cutoffs_)
+
+
+########################################################################################################################
@@ -0,0 +1,203 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Binary, memory-mapped layout of input/document_term_vectors.dat (CSR - compressed sparse row)
+#
+# header        - magic (8 bytes), N, nnz, doc id bytes (int64 each)
+# offsets       - int64[N + 1], terms of document i are at [offsets[i], offsets[i + 1])
+# term_ids      - int32[nnz]
+# term_freqs    - int32[nnz]
+# doc_lens      - int64[N], sum of the term frequencies of document i
+# id_offsets    - int64[N + 1], id of document i is id_blob[id_offsets[i]:id_offsets[i + 1]]
+# id_blob       - uint8[doc id bytes], utf-8 document ids
+# id_order      - int64[N], document indexes sorted by document id bytes
+#
+# every section starts on an 8 byte boundary - opening a collection maps every section without reading it, document ids
+# are decoded one at a time when they are looked up, and found by binary search over id_order
+
+########################################################################################################################
+
+
+# python packages
+from numpy import memmap, dtype, asarray, concatenate, cumsum, frombuffer, int32, int64, uint8
+
+# local packages
+from DocStore import DocStore
+
+
+########################################################################################################################
+
+
+# variable to hold file magic
+MAGIC = b'IRDMCOL3'
+# variable to hold header size
+HEADER_SIZE = len(MAGIC) + 3 * 8
+
+
+########################################################################################################################
+
+
+# returns size of a section padded to 8 bytes
+def pad8(size):
+
+    # return padded size
+    return (size + 7) // 8 * 8
+
+
+########################################################################################################################
+
+
+# document ids of a binary collection, decoded from the memory-mapped id sections on access
+class DocIds(object):
+
+    __slots__ = ('id_offsets', 'id_blob')
+
+    def __init__(self, id_offsets, id_blob):
+
+        # document id offsets, id of document i is id_blob[id_offsets[i]:id_offsets[i + 1]] - memory views of the
+        # mapped sections, which index and slice without numpy overhead or copying the pages
+        self.id_offsets = memoryview(id_offsets)
+        # utf-8 document ids, back to back
+        self.id_blob = memoryview(id_blob)
+
+    # returns number of documents
+    def __len__(self):
+
+        # return number of document id offsets, minus the end offset
+        return len(self.id_offsets) - 1
+
+    # returns utf-8 bytes of the document id of a given document index
+    def id_bytes(self, doc_index):
+
+        # return document id bytes
+        return self.id_blob[self.id_offsets[doc_index]:self.id_offsets[doc_index + 1]].tobytes()
+
+    # returns document id of a given document index
+    def __getitem__(self, doc_index):
+
+        # if document index is out of range
+        if not -len(self) <= doc_index < len(self):
+            raise IndexError('document index {} out of range'.format(doc_index))
+
+        # return decoded document id, wrapping negative document index
+        return self.id_bytes(doc_index % len(self)).decode('utf-8')
+
+    # yields every document id, in collection order
+    def __iter__(self):
+
+        # for every document index
+        for doc_index in range(len(self)):
+            yield self[doc_index]
+
+
+########################################################################################################################
+
+
+# document id -> document index of a binary collection, by binary search over its memory-mapped sorted id table
+class DocIndexes(object):
+
+    __slots__ = ('doc_ids', 'id_order')
+
+    def __init__(self, doc_ids, id_order):
+
+        # document ids of the collection
+        self.doc_ids = doc_ids
+        # document indexes sorted by document id bytes, a memory view of the mapped section
+        self.id_order = memoryview(id_order)
+
+    # returns document index of a given document id
+    def __getitem__(self, doc_id):
+
+        # encode document id, utf-8 bytes sort in the same order as the ids
+        key = doc_id.encode('utf-8')
+
+        # find first position of the sorted id table whose id is not below the key
+        low, high = 0, len(self.id_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.doc_ids.id_bytes(self.id_order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        # if document id is not in the collection
+        if low == len(self.id_order) or self.doc_ids.id_bytes(self.id_order[low]) != key:
+            raise KeyError(doc_id)
+
+        # return document index
+        return self.id_order[low]
+
+
+########################################################################################################################
+
+
+# writes a document store to a binary collection file
+def write_collection(output_file, store):
+
+    # encode document ids back to back
+    encoded_doc_ids = [doc_id.encode('utf-8') for doc_id in store.doc_ids]
+    id_blob = b''.join(encoded_doc_ids)
+    id_offsets = concatenate([[0], cumsum([len(x) for x in encoded_doc_ids], dtype=int64)])
+    # sort document indexes by document id bytes
+    id_order = sorted(range(store.N), key=encoded_doc_ids.__getitem__)
+
+    # open file
+    with open(output_file, mode='wb') as output_file:
+        # write header
+        output_file.write(MAGIC)
+        output_file.write(asarray([store.N, len(store.term_ids), len(id_blob)], dtype=int64).tobytes())
+        # write every section, padded to 8 bytes
+        for section in (asarray(store.offsets, dtype=int64), asarray(store.term_ids, dtype=int32),
+                        asarray(store.term_freqs, dtype=int32), asarray(store.doc_lens, dtype=int64),
+                        asarray(id_offsets, dtype=int64), frombuffer(id_blob, dtype=uint8),
+                        asarray(id_order, dtype=int64)):
+            data = section.tobytes()
+            output_file.write(data + b'\0' * (pad8(len(data)) - len(data)))
+
+    # return number of documents and number of terms
+    return store.N, len(store.term_ids)
+
+
+########################################################################################################################
+
+
+# opens a binary collection file, memory-mapping every section
+def open_collection(input_file):
+
+    # read header
+    with open(input_file, mode='rb') as header_file:
+        header = header_file.read(HEADER_SIZE)
+    # if magic does not match
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a binary collection file, or was built by an older BuildCollection.py - rebuild it'
+                         .format(input_file))
+    # get number of documents, number of terms and document id bytes
+    N, nnz, id_bytes = frombuffer(header[len(MAGIC):], dtype=int64).tolist()
+
+    # list to hold memory-mapped sections
+    sections = []
+    # variable to hold current section offset
+    offset = HEADER_SIZE
+    # for every section data type and length
+    for section_dtype, length in ((int64, N + 1), (int32, nnz), (int32, nnz), (int64, N), (int64, N + 1),
+                                  (uint8, id_bytes), (int64, N)):
+        # memory-map section, zero length sections cannot be mapped
+        if length:
+            sections += [memmap(input_file, dtype=section_dtype, mode='r', offset=offset, shape=(length,))]
+        else:
+            sections += [asarray([], dtype=section_dtype)]
+        # move to next section
+        offset += pad8(length * dtype(section_dtype).itemsize)
+
+    # get offsets, term ids, term frequencies, document lengths, document id offsets, document ids and sorted id table
+    # sections
+    offsets, term_ids, term_freqs, doc_lens, id_offsets, id_blob, id_order = sections
+    # get document ids
+    doc_ids = DocIds(id_offsets, id_blob)
+
+    # return document store backed by the memory-mapped arrays
+    return DocStore(doc_ids, offsets, term_ids, term_freqs, doc_lens, DocIndexes(doc_ids, id_order))
+
+
+########################################################################################################################
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# One-time conversion of input/document_term_vectors.dat to the binary collection format read by every scorer,
+# together with its collection statistics and tf-idf vectors
+
+########################################################################################################################
+
+
+# python packages
+import argparse
+
+# local packages
+from DocLoader import iter_docs
+from DocStore import build_doc_store
+from BinaryCollection import write_collection
+from CollectionStats import build_collection_stats, save_collection_stats, stats_file_path
+from TfIdfVectors import build_tf_idf_vectors, save_tf_idf_vectors, vectors_file_path
+
+
+########################################################################################################################
+
+
+# main function
+def main(input_file, output_file):
+
+    # stream documents from the text collection into a document store
+    store = build_doc_store(iter_docs(input_file))
+    # write it as a binary collection
+    N, nnz = write_collection(output_file, store)
+    # print progress
+    print('\nSaved {} documents and {} terms to file at path: \'{}\'\n'.format(N, nnz, output_file))
+
+    # compute collection statistics and persist them next to the binary collection
+    stats = build_collection_stats(store.N, int(store.doc_lens.sum()), store.doc_freq())
+    save_collection_stats(stats, stats_file_path(output_file))
+    # print progress
+    print('Saved collection statistics to file at path: \'{}\'\n'.format(stats_file_path(output_file)))
+
+    # compute normalised tf-idf vectors and norms of every document and persist them next to the binary collection
+    save_tf_idf_vectors(build_tf_idf_vectors(store, stats), vectors_file_path(output_file))
+    # print progress
+    print('Saved tf-idf vectors to file at path: \'{}\'\n'.format(vectors_file_path(output_file)))
+
+
+########################################################################################################################
+
+
+# runs main function
+if __name__ == '__main__':
+
+    # parse script arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', type=str, dest='input_', metavar='text collection file',
+                        default='input/document_term_vectors.dat', help='text collection file')
+    parser.add_argument('-o', '--output', type=str, dest='output_', metavar='binary collection file',
+                        default='input/document_term_vectors.bin', help='binary collection file')
+    args = parser.parse_args()
+
+    # call main function with the script arguments as parameters
+    main(args.input_, args.output_)
+
+
+########################################################################################################################
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Collection statistics - N, documents length, average document length, document frequency and idf of every term -
+# computed in one pass and persisted next to the collection as '<collection file>.stats.npz'
+
+########################################################################################################################
+
+
+# python packages
+from math import log2, log10
+from numpy import load, savez, asarray, float64, int64
+
+# local packages
+from DocLoader import calc_doc_stats
+from FileCache import cache_file_path, get_cached
+
+
+########################################################################################################################
+
+
+# collection statistics object
+class CollectionStats(object):
+
+    def __init__(self, N, docs_len, term_ids, doc_freq, bm25_idf, tf_idf_idf):
+
+        # number of documents in the collection
+        self.N = N
+        # documents length
+        self.docs_len = docs_len
+        # average document length
+        self.avg_doc_len = docs_len / N
+        # term ids, ascending
+        self.term_ids = term_ids
+        # document frequency of every term id, aligned with term ids
+        self.doc_freq = doc_freq
+        # bm25 idf of every term id - log2((N - nqi + 0.5) / (nqi + 0.5))
+        self.bm25_idf = bm25_idf
+        # tf-idf idf of every term id - log10(N / nqi)
+        self.tf_idf_idf = tf_idf_idf
+
+    # returns term id -> bm25 idf dictionary
+    def bm25_idf_dict(self):
+
+        # return dictionary
+        return dict(zip(self.term_ids.tolist(), self.bm25_idf.tolist()))
+
+
+########################################################################################################################
+
+
+# builds collection statistics from number of documents, documents length and term id -> document frequency
+def build_collection_stats(N, docs_len, doc_freq):
+
+    # sort term ids
+    term_ids = sorted(doc_freq)
+    # get document frequency of every term id
+    nqi = [doc_freq[x] for x in term_ids]
+
+    # calculate idf of every term id, with the same float operations the scorers use
+    bm25_idf = [log2((N - x + 0.5) / (x + 0.5)) for x in nqi]
+    tf_idf_idf = [log10(N / x) for x in nqi]
+
+    # return collection statistics
+    return CollectionStats(N, docs_len, asarray(term_ids, dtype=int64), asarray(nqi, dtype=int64),
+                           asarray(bm25_idf, dtype=float64), asarray(tf_idf_idf, dtype=float64))
+
+
+########################################################################################################################
+
+
+# returns path of the statistics file of a given collection file
+def stats_file_path(collection_file):
+
+    # return full collection file path, plus statistics extension
+    return cache_file_path(collection_file, '.stats.npz')
+
+
+########################################################################################################################
+
+
+# saves collection statistics
+def save_collection_stats(stats, output_file):
+
+    # open file
+    with open(output_file, mode='wb') as output_file:
+        # write every statistic as an array
+        savez(output_file, N=stats.N, docs_len=stats.docs_len, term_ids=stats.term_ids, doc_freq=stats.doc_freq,
+              bm25_idf=stats.bm25_idf, tf_idf_idf=stats.tf_idf_idf)
+
+
+########################################################################################################################
+
+
+# loads collection statistics
+def load_collection_stats(input_file):
+
+    # open file
+    with load(input_file) as data:
+        # return collection statistics
+        return CollectionStats(int(data['N']), int(data['docs_len']), data['term_ids'], data['doc_freq'],
+                               data['bm25_idf'], data['tf_idf_idf'])
+
+
+########################################################################################################################
+
+
+# returns statistics of a collection, loading them if persisted, up to date and - when the document store is given -
+# counting the same documents and lengths as it, else computing and persisting them
+def get_collection_stats(collection_file, store=None):
+
+    # computes statistics of the collection
+    def build():
+
+        # if document store is already loaded
+        if store is not None:
+            # compute statistics from its arrays
+            return build_collection_stats(store.N, int(store.doc_lens.sum()), store.doc_freq())
+
+        # compute statistics streaming the collection, without holding it in memory
+        doc_stats = calc_doc_stats(collection_file)
+        return build_collection_stats(doc_stats.N, doc_stats.docs_len, doc_stats.doc_freq)
+
+    # returns whether persisted statistics describe the document store, if given
+    def valid(stats):
+
+        # return whether number of documents and documents length match
+        return store is None or (stats.N == store.N and stats.docs_len == int(store.doc_lens.sum()))
+
+    # return statistics
+    return get_cached(collection_file, stats_file_path(collection_file), load_collection_stats, build,
+                      save_collection_stats, valid)
+
+
+########################################################################################################################
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Shared loader for input/document_term_vectors.dat, one document per line: 'doc_id term_id:term_freq ...'
+# Files ending in '.bin' are read as binary collections written by BuildCollection.py
+
+########################################################################################################################
+
+
+# python packages
+from collections import Counter
+
+# local packages
+from BinaryCollection import open_collection
+from DocStore import build_doc_store
+from DocOffsets import get_doc_offsets
+
+
+########################################################################################################################
+
+
+# document statistics object
+class DocStats(object):
+
+    def __init__(self):
+
+        # number of documents in the collection
+        self.N = 0
+        # documents length
+        self.docs_len = 0
+        # document frequency - term id -> number of documents containing the term
+        self.doc_freq = Counter()
+
+    # adds a document vector to the statistics
+    def add(self, doc_id, doc_vec):
+
+        # increment number of documents
+        self.N += 1
+        # for every term id and term frequency in document vector
+        for term_id, term_freq in doc_vec:
+            # add term frequency to documents length
+            self.docs_len += term_freq
+            # increment document frequency of term id
+            self.doc_freq[term_id] += 1
+
+
+########################################################################################################################
+
+
+# parses a line of the documents file into document id and document vector
+def parse_doc_line(line):
+
+    # split line into tokens
+    tokens = line.strip(' \n').split(' ')
+
+    # document vector - list of (term id, term frequency)
+    doc_vec = []
+    # for every token except the first one
+    for token in tokens[1:]:
+        # split token on ':' once
+        term_id, _, term_freq = token.partition(':')
+        # add term id and term frequency to document vector
+        doc_vec += [(int(term_id), int(term_freq))]
+
+    # return document id and document vector
+    return tokens[0], doc_vec
+
+
+########################################################################################################################
+
+
+# streams documents from file, yielding (document id, document vector) for the first line of every document id
+def iter_docs(input_file):
+
+    # if input file is a binary collection, documents are already unique and parsed
+    if input_file.endswith('.bin'):
+        # yield every document of the binary collection
+        yield from open_collection(input_file).iter_docs()
+        return
+
+    # set to hold ids of documents already seen
+    seen_doc_ids = set()
+
+    # open file
+    with open(input_file) as input_file:
+        # for every line in input file
+        for line in input_file:
+            # get document id, the first token
+            doc_id = line.strip(' \n').split(' ', 1)[0]
+            # skip blank lines
+            if not doc_id:
+                continue
+            # later lines repeating a document id are ignored, without parsing their terms
+            if doc_id in seen_doc_ids:
+                continue
+            # add document id to seen documents
+            seen_doc_ids.add(doc_id)
+            # parse line and yield document id and document vector
+            yield parse_doc_line(line)
+
+
+########################################################################################################################
+
+
+# loads documents into a columnar document store, memory-mapping binary collections instead of copying them
+def load_doc_store(input_file):
+
+    # if input file is a binary collection
+    if input_file.endswith('.bin'):
+        # return memory-mapped document store
+        return open_collection(input_file)
+
+    # return document store built from the streamed documents
+    return build_doc_store(iter_docs(input_file))
+
+
+########################################################################################################################
+
+
+# loads only the given documents into a columnar document store - text collections are read one document at a time
+# through the document id -> byte offset index, binary collections are copied out of their memory map
+def load_doc_subset(input_file, doc_ids):
+
+    # get unique document ids, in first occurrence order
+    doc_ids = list(dict.fromkeys(doc_ids))
+
+    # if input file is a binary collection
+    if input_file.endswith('.bin'):
+        # open memory-mapped collection
+        collection = open_collection(input_file)
+        # return document store built from the given documents
+        return build_doc_store((x, collection.doc_vec(collection.doc_index(x))) for x in doc_ids)
+
+    # get byte offset of every document
+    doc_offsets = get_doc_offsets(input_file)
+    # dictionary to hold document id -> document vector
+    doc_vecs = {}
+
+    # open file in binary mode, to seek to byte offsets
+    with open(input_file, mode='rb') as collection_file:
+        # for every document id, in file order
+        for doc_id in sorted(doc_ids, key=doc_offsets.__getitem__):
+            # seek to its first line and parse it
+            collection_file.seek(doc_offsets[doc_id])
+            doc_vecs[doc_id] = parse_doc_line(collection_file.readline().decode('utf-8'))[1]
+
+    # return document store built from the given documents, in the given order
+    return build_doc_store((x, doc_vecs[x]) for x in doc_ids)
+
+
+########################################################################################################################
+
+
+# calculates document statistics without holding the collection in memory
+def calc_doc_stats(input_file):
+
+    # create document statistics
+    stats = DocStats()
+
+    # stream every document through the statistics
+    for doc_id, doc_vec in iter_docs(input_file):
+        stats.add(doc_id, doc_vec)
+
+    # return document statistics
+    return stats
+
+
+########################################################################################################################
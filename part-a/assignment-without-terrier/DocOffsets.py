@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Document id -> byte offset index of a text collection - the offset of the first line of every document id, so single
+# documents can be read with one seek instead of scanning the collection, persisted next to the collection as
+# '<collection file>.offsets.npz'
+
+########################################################################################################################
+
+
+# python packages
+from os import path
+from numpy import load, savez, asarray, int64
+
+# local packages
+from FileCache import cache_file_path, get_cached
+
+
+########################################################################################################################
+
+
+# builds document id -> byte offset of the first line of every document id of a text collection
+def build_doc_offsets(input_file):
+
+    # dictionary to hold document id -> byte offset
+    doc_offsets = {}
+    # variable to hold byte offset of the current line
+    offset = 0
+
+    # open file in binary mode, so offsets are byte positions
+    with open(input_file, mode='rb') as input_file:
+        # for every line in input file
+        for line in input_file:
+            # get document id, the first token
+            doc_id = line.strip(b' \r\n').split(b' ', 1)[0].decode('utf-8')
+            # if line is not blank and document id is seen for the first time, add its offset
+            if doc_id and doc_id not in doc_offsets:
+                doc_offsets[doc_id] = offset
+            # move offset past the line
+            offset += len(line)
+
+    # return document id -> byte offset
+    return doc_offsets
+
+
+########################################################################################################################
+
+
+# returns path of the offsets file of a given collection file
+def offsets_file_path(collection_file):
+
+    # return full collection file path, plus offsets extension
+    return cache_file_path(collection_file, '.offsets.npz')
+
+
+########################################################################################################################
+
+
+# saves document id -> byte offset
+def save_doc_offsets(doc_offsets, output_file):
+
+    # open file
+    with open(output_file, mode='wb') as output_file:
+        # write document ids and byte offsets as aligned arrays
+        savez(output_file, doc_ids=asarray(list(doc_offsets), dtype=str),
+              offsets=asarray(list(doc_offsets.values()), dtype=int64))
+
+
+########################################################################################################################
+
+
+# loads document id -> byte offset
+def load_doc_offsets(input_file):
+
+    # open file
+    with load(input_file) as data:
+        # return document id -> byte offset
+        return dict(zip(data['doc_ids'].tolist(), data['offsets'].tolist()))
+
+
+########################################################################################################################
+
+
+# returns document id -> byte offset of a text collection, loading it if persisted, up to date and within the
+# collection, else building and persisting it
+def get_doc_offsets(collection_file):
+
+    # returns whether persisted offsets all fall within the collection
+    def valid(doc_offsets):
+
+        # return whether the highest offset is before the end of the collection
+        return max(doc_offsets.values(), default=-1) < path.getsize(collection_file)
+
+    # return document id -> byte offset
+    return get_cached(collection_file, offsets_file_path(collection_file), load_doc_offsets,
+                      lambda: build_doc_offsets(collection_file), save_doc_offsets, valid)
+
+
+########################################################################################################################
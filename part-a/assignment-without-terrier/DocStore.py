@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Columnar document store - every document's term ids and term frequencies live back to back in two integer arrays,
+# with an offsets array marking where each document starts (CSR - compressed sparse row)
+
+########################################################################################################################
+
+
+# python packages
+from array import array
+from numpy import asarray, concatenate, cumsum, unique, int64
+
+
+########################################################################################################################
+
+
+# document store object
+class DocStore(object):
+
+    __slots__ = ('doc_ids', 'offsets', 'term_ids', 'term_freqs', 'doc_lens', 'N', 'doc_indexes')
+
+    def __init__(self, doc_ids, offsets, term_ids, term_freqs, doc_lens=None, doc_indexes=None):
+
+        # document ids, in collection order
+        self.doc_ids = doc_ids
+        # document offsets into term ids and term frequencies, terms of document i are at [offsets[i], offsets[i + 1])
+        self.offsets = asarray(offsets)
+        # term ids of all documents, back to back
+        self.term_ids = asarray(term_ids)
+        # term frequencies of all documents, back to back
+        self.term_freqs = asarray(term_freqs)
+        # if document lengths are not given
+        if doc_lens is None:
+            # calculate them from cumulative term frequencies
+            cum_term_freqs = concatenate([[0], cumsum(self.term_freqs, dtype=int64)])
+            doc_lens = cum_term_freqs[self.offsets[1:]] - cum_term_freqs[self.offsets[:-1]]
+        # document lengths
+        self.doc_lens = asarray(doc_lens)
+        # number of documents in the collection
+        self.N = len(doc_ids)
+        # document id -> document index, built on the first lookup when not given
+        self.doc_indexes = doc_indexes
+
+    # returns document index of a given document id
+    def doc_index(self, doc_id):
+
+        # if document id -> document index has not been built yet
+        if self.doc_indexes is None:
+            # build it once, for every lookup
+            self.doc_indexes = {x: i for i, x in enumerate(self.doc_ids)}
+
+        # return document index
+        return self.doc_indexes[doc_id]
+
+    # returns term ids and term frequencies arrays of a given document index
+    def terms(self, doc_index):
+
+        # get start and end of document terms
+        start, end = self.offsets[doc_index], self.offsets[doc_index + 1]
+
+        # return term ids and term frequencies views
+        return self.term_ids[start:end], self.term_freqs[start:end]
+
+    # returns document vector of a given document index, as a list of (term id, term frequency)
+    def doc_vec(self, doc_index):
+
+        # get term ids and term frequencies
+        term_ids, term_freqs = self.terms(doc_index)
+
+        # return document vector
+        return list(zip(term_ids.tolist(), term_freqs.tolist()))
+
+    # yields (document id, document vector) for every document, in collection order
+    def iter_docs(self):
+
+        # for every document index and document id
+        for doc_index, doc_id in enumerate(self.doc_ids):
+            yield doc_id, self.doc_vec(doc_index)
+
+    # returns document frequency - term id -> number of documents containing the term
+    def doc_freq(self):
+
+        # count term id occurrences
+        term_ids, counts = unique(self.term_ids, return_counts=True)
+
+        # return document frequency
+        return dict(zip(term_ids.tolist(), counts.tolist()))
+
+
+########################################################################################################################
+
+
+# builds a document store from (document id, document vector) pairs
+def build_doc_store(docs):
+
+    # list to hold document ids
+    doc_ids = []
+    # arrays to hold document offsets, term ids and term frequencies
+    offsets = array('q', [0])
+    term_ids = array('i')
+    term_freqs = array('i')
+
+    # for every document
+    for doc_id, doc_vec in docs:
+        # add document id
+        doc_ids += [doc_id]
+        # for every term id and term frequency in document vector
+        for term_id, term_freq in doc_vec:
+            # add term id and term frequency
+            term_ids.append(term_id)
+            term_freqs.append(term_freq)
+        # add document end offset
+        offsets.append(len(term_ids))
+
+    # return document store
+    return DocStore(doc_ids, offsets, term_ids, term_freqs)
+
+
+########################################################################################################################
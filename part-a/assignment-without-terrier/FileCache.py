@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Files derived from an input file - collection statistics, tf-idf vectors, document offsets, qrels index - cached next
+# to it as '<input file><extension>', so every input file, extension included, has its own cache. A cache is used when
+# it is not older than its input file and its content passes the caller's check, else it is rebuilt and saved again
+
+########################################################################################################################
+
+
+# python packages
+from os import path
+
+
+########################################################################################################################
+
+
+# returns path of the cache file of a given input file and cache extension
+def cache_file_path(input_file, extension):
+
+    # return full input file path, plus cache extension
+    return input_file + extension
+
+
+########################################################################################################################
+
+
+# returns data derived from an input file, loading its cache if up to date and valid, else building and caching it
+#
+# cache_file    - cache file path, from cache_file_path
+# load          - load(cache_file) returns the cached data
+# build         - build() returns the data, built from the input file
+# save          - save(data, cache_file) writes the data to the cache file
+# valid         - valid(data) returns whether cached data can be used, every cache is valid when it is not given
+def get_cached(input_file, cache_file, load, build, save, valid=None):
+
+    # if cache file exists and is not older than the input file
+    if path.exists(cache_file) and path.getmtime(cache_file) >= path.getmtime(input_file):
+        # load cached data
+        data = load(cache_file)
+        # if it passes the check, return it
+        if valid is None or valid(data):
+            return data
+
+    # build data from the input file
+    data = build()
+    # cache it next to the input file
+    save(data, cache_file)
+
+    # return data
+    return data
+
+
+########################################################################################################################
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Greedy diversification of a query's candidate documents, shared by every reranker - the top BM25 document is
+# selected first, then each rank selects the remaining candidate with the highest objective value. The objective is a
+# plug-in holding whatever state it needs - MMR's highest similarity to the selected documents, mean-variance's
+# accumulated correlation with them, or per-aspect coverage for xQuAD-style objectives - updated with every selected
+# document and its similarity column.
+# Candidates are indexed by their position in the BM25 ranking, so selection is an argmax over an array. Rerankers
+# run their queries through rerank_queries, one run file per parameter value, one process or a pool of forked workers
+
+########################################################################################################################
+
+
+# python packages
+from contextlib import ExitStack
+from multiprocessing import get_context
+from numpy import asarray, flatnonzero, ones, inf
+
+# local packages
+from RunWriter import RunWriter
+
+
+########################################################################################################################
+
+
+# reranks candidate documents of a query and writes them in standard TREC format
+#
+# doc_ids       - candidate document ids, in BM25 rank order
+# doc_score     - candidate BM25 scores, aligned with document ids
+# column        - column(j, candidates) returns the similarity of every given candidate index to candidate j
+# objective     - object with run_tag, start(relevance), scores(rank) returning a new array of the objective value of
+#                 every candidate, and update(selected, candidates, sim) taking the candidate index of a newly selected
+#                 document and its similarity to the given remaining candidates
+# first_run_tag - run tag of the top bm25 document, written as it is
+def rerank(query_id, doc_ids, doc_score, column, objective, results_file, first_run_tag):
+
+    # assign length of document ids to n
+    n = len(doc_ids)
+    # get max score and normalised bm25 score of every candidate
+    max_score = max(doc_score)
+    relevance = asarray(doc_score, dtype=float) / max_score
+
+    # write top bm25 document in standard TREC format
+    results_file.write(query_id, doc_ids[0], 0, max_score, first_run_tag)
+    # print progress
+    print('query id {} - scored 0 out of {} documents'.format(query_id, n))
+
+    # array to hold whether every candidate is still remaining
+    remaining = ones(n, dtype=bool)
+    remaining[0] = False
+    # start objective and update it with the top bm25 document
+    objective.start(relevance)
+    candidates = flatnonzero(remaining)
+    objective.update(0, candidates, column(0, candidates))
+
+    # for every rank after the first
+    for doc_rank in range(1, n):
+        # calculate objective value of every candidate, excluding selected ones
+        values = objective.scores(doc_rank)
+        values[~remaining] = -inf
+        # select first candidate with the highest objective value
+        selected = int(values.argmax())
+        remaining[selected] = False
+
+        # write results in standard TREC format
+        results_file.write(query_id, doc_ids[selected], doc_rank, float(values[selected]), objective.run_tag)
+        # print progress
+        print('query id {} - scored {} out of {} documents'.format(query_id, doc_rank, n))
+
+        # update objective with the selected document
+        candidates = flatnonzero(remaining)
+        objective.update(selected, candidates, column(selected, candidates))
+
+
+########################################################################################################################
+
+
+# returns column function of a similarity matrix over candidate indexes
+def matrix_column(sim_matrix):
+
+    # return column lookup
+    return lambda j, candidates: sim_matrix[candidates, j]
+
+
+########################################################################################################################
+
+
+# returns column function of a pairwise similarity function over candidate document ids
+def pairwise_column(doc_ids, sim):
+
+    # return column calculation, one call per remaining candidate
+    return lambda j, candidates: asarray([sim(doc_ids[x], doc_ids[j]) for x in candidates.tolist()], dtype=float)
+
+
+########################################################################################################################
+
+
+# reranks every query and writes one run file per parameter value
+#
+# query_args    - arguments of every query, in query order
+# worker_fn     - worker_fn(query_args) reranks one query and returns one run buffer per run file - it reads documents
+#                 from module-level state set before this call, which forked workers inherit copy-on-write
+# run_paths     - path of every run file, aligned with the run buffers
+# workers       - number of worker processes, queries are reranked in this process when not more than 1
+def rerank_queries(query_args, worker_fn, run_paths, workers):
+
+    # open worker pool first, so it is terminated last - after a run writer is published, or discarded if a query raised
+    with ExitStack() as stack:
+        # if queries are reranked in parallel
+        if workers > 1:
+            # fork worker processes and rerank queries in parallel, results come back in query order
+            pool = stack.enter_context(get_context('fork').Pool(workers))
+            all_buffers = pool.imap(worker_fn, query_args)
+        else:
+            # rerank queries one by one
+            all_buffers = map(worker_fn, query_args)
+
+        # open one run writer per run file
+        results_files = [stack.enter_context(RunWriter(x)) for x in run_paths]
+        # for every query's run buffers
+        for buffers in all_buffers:
+            # for every run writer and run buffer
+            for results_file, buffer in zip(results_files, buffers):
+                # write results in standard TREC format
+                results_file.write_buffer(buffer)
+
+    # for every run file
+    for run_path in run_paths:
+        # print progress
+        print('\nSaved results to file at path: \'{}\'\n'.format(run_path))
+
+
+########################################################################################################################
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Ref: https://nlp.stanford.edu/IR-book/html/htmledition/a-first-take-at-building-an-inverted-index-1.html
+
+########################################################################################################################
+
+
+# python packages
+from array import array
+from collections import OrderedDict
+from numpy import arange, argsort, concatenate, diff, repeat, unique, int32, int64
+
+
+########################################################################################################################
+
+
+# inverted index object
+class InvertedIndex(object):
+
+    def __init__(self, doc_ids, doc_lens, postings, stats):
+
+        # document ids, in collection order
+        self.doc_ids = doc_ids
+        # document lengths, in collection order
+        self.doc_lens = doc_lens
+        # postings - term id -> (document indexes, term frequencies)
+        self.postings = postings
+        # average document length
+        self.avg_doc_len = stats.avg_doc_len
+        # number of documents in the collection
+        self.N = len(doc_ids)
+        # bm25 idf of every term id, from the persisted collection statistics
+        self.idf = stats.bm25_idf_dict()
+        # per-term score upper bounds, filled lazily by top k retrieval
+        self.upper_bounds = {}
+        # per-b document length normalisations, filled lazily by bm25 scoring
+        self.length_norms_cache = {}
+
+    # returns (1 - b + b * doc_len / avg_doc_len) of every document, computed once per value of b
+    def length_norms(self, b):
+
+        # if length normalisations have not been calculated for b yet
+        if b not in self.length_norms_cache:
+            # calculate them for every document
+            self.length_norms_cache[b] = [1 - b + b * doc_len / self.avg_doc_len for doc_len in self.doc_lens]
+
+        # return length normalisations
+        return self.length_norms_cache[b]
+
+
+########################################################################################################################
+
+
+# builds inverted index from the arrays of a document store, without creating per-document objects
+def build_index(store, stats):
+
+    # get term ids and term frequencies arrays
+    term_ids = store.term_ids
+    term_freqs = store.term_freqs
+
+    # document index of every term occurrence
+    doc_indexes = repeat(arange(store.N, dtype=int32), diff(store.offsets))
+    # order term occurrences by term id, keeping collection order within a term
+    order = argsort(term_ids, kind='stable')
+    sorted_term_ids = term_ids[order]
+    sorted_doc_indexes = doc_indexes[order].astype(int32)
+    sorted_term_freqs = term_freqs[order].astype(int32)
+
+    # get every term id and where its postings start
+    postings_term_ids, starts = unique(sorted_term_ids, return_index=True)
+    ends = concatenate([starts[1:], [len(sorted_term_ids)]])
+
+    # dictionary to hold postings
+    postings = OrderedDict()
+    # for every term id and postings start and end
+    for term_id, start, end in zip(postings_term_ids.tolist(), starts.tolist(), ends.tolist()):
+        # add document indexes and term frequencies to postings, as contiguous integer arrays
+        postings[term_id] = (array('i', sorted_doc_indexes[start:end].tobytes()),
+                             array('i', sorted_term_freqs[start:end].tobytes()))
+
+    # return inverted index
+    return InvertedIndex(store.doc_ids, array('q', store.doc_lens.astype(int64).tobytes()), postings, stats)
+
+
+########################################################################################################################
@@ -9,50 +9,16 @@
 
 # python packages
 import argparse
-from math import sqrt, log10
-from collections import OrderedDict, Counter
+from numpy import full, maximum, inf
 
-
-########################################################################################################################
-
-
-# loads docs
-def load_docs(input_file):
-
-    # list to hold unique docs
-    unique_doc_ids = []
-    # list to hold document vector
-    doc_vec = []
-    # list to hold document term ids
-    doc_term_ids = []
-
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # if document id is not in unique docs
-            if line.split(' ')[0] not in unique_doc_ids:
-                # add document id to unique documents list
-                unique_doc_ids += [line.split(' ')[0]]
-                # split line into tokens
-                tokens = line.strip(' \n').split(' ')
-                # assign first token to document id
-                doc_id = tokens[0]
-                # list to hold temporary document vector
-                doc_vec_temp = []
-                # for every token except the first one
-                for token in tokens[1:]:
-                    # split token
-                    token = token.split(':')
-                    # add first token to document term ids
-                    doc_term_ids += [int(token[0])]
-                    # add first and second token to temporary document vector
-                    doc_vec_temp += [(int(token[0]), int(token[1]))]
-                # add document id and temporary document vector to document vector list
-                doc_vec += [(doc_id, doc_vec_temp)]
-
-    # return document vector and document term ids
-    return doc_vec, doc_term_ids
+# local packages
+from DocLoader import load_doc_store, load_doc_subset
+from CollectionStats import get_collection_stats
+from RunWriter import RunBuffer
+from TfIdfVectors import build_tf_idf_vectors, get_tf_idf_vectors, select_tf_idf_vectors
+from SimilarityMatrix import calc_cosine_matrix
+from SimilarityCache import SimilarityCache
+from GreedyReranker import rerank, rerank_queries, matrix_column, pairwise_column
 
 
 ########################################################################################################################
@@ -96,51 +62,20 @@ def load_results(input_file):
 ########################################################################################################################
 
 
-# dictionary to hold rq tf-idf memoize
-rq_tf_idf_memoize = {}
-# dictionary to hold dq tf-idf memoize
-dq_tf_idf_memoize = {}
-
-# dictionary to hold rq sum memoize
-rq_sum_memoize = {}
-# dictionary to hold dq sum memoize
-dq_sum_memoize = {}
-
-
-# calculates cosine similarity between two given documents
-def calc_sim(rq_doc_id, dq_doc_id, rq_doc_vec, dq_doc_vec, idf):
+# calculates cosine similarity between two given documents, from their normalised tf-idf vectors - term id ->
+# weight - and the factors turning those back into tf-idf over raw term frequency norms
+def calc_sim(rq_doc_vec, dq_doc_vec, rq_scale, dq_scale):
 
     # assign intersection of rq document vector and dq document vector to intersection
     intersection = rq_doc_vec.keys() & dq_doc_vec.keys()
     # sort intersection in ascending order
     intersection = sorted(intersection)
 
-    # if rq document id is not in rq tf-idf memoize or dq document id is not in dq tf-idf memoize
-    if rq_doc_id not in rq_tf_idf_memoize or dq_doc_id not in dq_tf_idf_memoize:
-        # calculate rq tf-idf and dq tf-idf
-        rq_tf_idf_memoize[rq_doc_id] = [idf.get(x) * rq_doc_vec.get(x) for x in intersection]
-        dq_tf_idf_memoize[dq_doc_id] = [idf.get(x) * dq_doc_vec.get(x) for x in intersection]
-
-    # get rq and dq tf-idf vector
-    rq_tf_idf_vector = rq_tf_idf_memoize.get(rq_doc_id)
-    dq_tf_idf_vector = dq_tf_idf_memoize.get(dq_doc_id)
-    # calculate dot product of rq and dq tf-idf vector
-    rq_dq_dot_product = sum([x * y for x, y in zip(rq_tf_idf_vector, dq_tf_idf_vector)])
-
-    # if rq document id is not in rq sum memoize or dq document id not in dq sum memoize
-    if rq_doc_id not in rq_sum_memoize or dq_doc_id not in dq_sum_memoize:
-        # assign rq and dq document vector values to rq and dq document term frequencies
-        rq_doc_term_freq = rq_doc_vec.values()
-        dq_doc_term_freq = dq_doc_vec.values()
-        # calculate sum of rq and dq document term frequencies
-        rq_sum_memoize[rq_doc_id] = sqrt(sum([(x ** 2) for x in rq_doc_term_freq]))
-        dq_sum_memoize[dq_doc_id] = sqrt(sum([(x ** 2) for x in dq_doc_term_freq]))
-
-    # calculate product of rq and dq sum
-    rq_dq_product = rq_sum_memoize.get(rq_doc_id) * dq_sum_memoize.get(dq_doc_id)
+    # calculate dot product of rq and dq normalised tf-idf vector
+    rq_dq_dot_product = sum([rq_doc_vec.get(x) * dq_doc_vec.get(x) for x in intersection])
 
     # calculate cosine
-    cos = float(rq_dq_dot_product) / rq_dq_product
+    cos = rq_dq_dot_product * rq_scale * dq_scale
 
     # return cosine
     return cos
@@ -149,129 +84,155 @@ def calc_sim(rq_doc_id, dq_doc_id, rq_doc_vec, dq_doc_vec, idf):
 ########################################################################################################################
 
 
+# returns similarity column function of the candidate documents of a query - 'matrix' computes every pair at once,
+# 'pairwise' calls calc_sim for every pair visited, through the given similarity cache
+def get_sim(store, doc_ids, vectors, similarity, cache):
+
+    # if similarity is computed as a matrix
+    if similarity == 'matrix':
+        # calculate cosine of every pair of candidates from their tf-idf vectors and return matrix lookup
+        return matrix_column(calc_cosine_matrix(store, vectors, doc_ids))
+
+    # get document index of every candidate document
+    doc_indexes = [store.doc_index(x) for x in doc_ids]
+    # get normalised tf-idf vector and scale of every candidate document from the tf-idf vectors, once per query
+    doc_vec = {x: dict(zip(*[y.tolist() for y in vectors.vector(store, i)])) for x, i in zip(doc_ids, doc_indexes)}
+    doc_scale = dict(zip(doc_ids, vectors.tf_scales(doc_indexes).tolist()))
+    # return cached pairwise calculation
+    return pairwise_column(doc_ids, lambda rq_doc_id, dq_doc_id: cache.get(rq_doc_id, dq_doc_id, lambda x, y: calc_sim(
+        doc_vec.get(x), doc_vec.get(y), doc_scale.get(x), doc_scale.get(y))))
+
+
+########################################################################################################################
+
+
+# mmr objective - lambda * normalised bm25 score - (1 - lambda) * highest similarity to the selected documents
+class MMRObjective(object):
+
+    def __init__(self, lambda_weight):
+
+        # lambda weight
+        self.lambda_weight = lambda_weight
+        # run tag
+        self.run_tag = 'mmr_l_{:.2f}'.format(lambda_weight)
+        # normalised bm25 score of every candidate
+        self.relevance = None
+        # highest similarity of every candidate to the selected documents
+        self.max_sim = None
+
+    # starts objective for a query's candidates
+    def start(self, relevance):
+
+        # assign normalised bm25 scores, no similarity yet
+        self.relevance = relevance
+        self.max_sim = full(len(relevance), -inf)
+
+    # returns mmr of every candidate
+    def scores(self, doc_rank):
+
+        # return mmr
+        return self.lambda_weight * self.relevance - (1 - self.lambda_weight) * self.max_sim
+
+    # updates highest similarity of given candidates with their similarity to a newly selected document
+    def update(self, selected, candidates, sim):
+
+        # keep highest similarity
+        self.max_sim[candidates] = maximum(self.max_sim[candidates], sim)
+
+
+########################################################################################################################
+
+
 # calculates mmr and ranks 100 given documents based on mmr
-def calc_mmr(query_id, qid_did_score, rq, doc_score, doc_vec, idf, lambda_weight):
+def calc_mmr(query_id, rq, doc_score, sim, lambda_weight, results_file):
 
-    # assign first token of document score to max score
-    max_score = max(doc_score)
-    # assign first token of rq to dq
-    dq = [rq[0]]
-    # remove first token of dq from rq
-    rq.remove(dq[0])
+    # rerank documents with the mmr objective
+    rerank(query_id, rq, doc_score, sim, MMRObjective(lambda_weight), results_file, 'bm25_b_0.75')
 
-    # open file
-    with open('output/temp/mmr_lambda_{:.2f}.txt'.format(lambda_weight), mode='a') as results_file:
-        # write results in standard TREC format
-        results_file.write('{} Q0 {} 0 {} bm25_b_0.75\n'.format(query_id, dq[0], max_score, lambda_weight))
-
-    # create dictionary of query id document id score and assign it to query id document id score
-    qid_did_score = dict(qid_did_score)
-    # create dictionary of document vector and assign it to document vector
-    doc_vec = dict(doc_vec)
-
-    # assign length of rq to rq length
-    rq_len = len(rq)
-    # print progress
-    print('query id {} - scored 0 out of {} documents'.format(query_id, rq_len + 1))
-    # variable to hold document rank set to 1
-    doc_rank = 1
-    # variable to hold print progress set to 1
-    print_progress = 1
-    # loop from 0 to rq length
-    for i in range(0, rq_len):
-        # variable to hold highest mmr set to null
-        high_mmr = None
-        # variable to hold highest mmr document set to null
-        high_mmr_doc_id = None
-        # open file
-        with open('output/temp/mmr_lambda_{:.2f}.txt'.format(lambda_weight), mode='a') as results_file:
-            # for every rq document id
-            for rq_doc_id in rq:
-                # for every dq document id
-                for dq_doc_id in dq:
-                    # assign rq document vector to rq document vector
-                    rq_doc_vec = doc_vec.get(rq_doc_id)
-                    # assign dq document vector to dq document vector
-                    dq_doc_vec = doc_vec.get(dq_doc_id)
-                    # concatenate query id and rq document id and assign to query id document id
-                    qid_did = ' '.join([str(query_id), rq_doc_id])
-                    # assign query id document id score to rq document score
-                    rq_doc_score = qid_did_score.get(qid_did)
-                    # calculate f1
-                    f1 = rq_doc_score / max_score
-                    # calculate f2
-                    f2 = calc_sim(rq_doc_id, dq_doc_id, OrderedDict(rq_doc_vec), OrderedDict(dq_doc_vec), idf)
-                    # calculate mmr
-                    mmr = lambda_weight * f1 - (1 - lambda_weight) * f2
-                    # if high mmr is null:
-                    if high_mmr is None:
-                        # assign mmr to high mmr
-                        high_mmr = mmr
-                        # assign rq document id to high mmr document id
-                        high_mmr_doc_id = rq_doc_id
-                    # if mmr is greater than high mmr:
-                    if mmr > high_mmr:
-                        # assign mmr to high mmr
-                        high_mmr = mmr
-                        # assign rq document id to high mmr document id
-                        high_mmr_doc_id = rq_doc_id
-
-            # add high mmr document id to dq
-            dq += [high_mmr_doc_id]
-            # write results in standard TREC format
-            results_file.write('{} Q0 {} {} {} mmr_l_{:.2f}\n'.format(query_id, high_mmr_doc_id, doc_rank, high_mmr,
-                                                                      lambda_weight))
-            # increment document rank
-            doc_rank += 1
-            # print progress
-            print('query id {} - scored {} out of {} documents'.format(query_id, print_progress, rq_len + 1))
-            # increment print progress
-            print_progress += 1
-            # remove high mmr document id from rq
-            rq.remove(high_mmr_doc_id)
-
-    # print progress
-    print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
-
-    # return
-    return
+
+########################################################################################################################
+
+
+# document store, tf-idf vectors and similarity cache read by rerank_query - set before rerank_queries forks workers
+shared_store = None
+shared_vectors = None
+shared_cache = None
+
+
+# calculates mmr of a single query's candidate documents for every lambda weight, returning one run buffer per weight
+def rerank_query(query_args):
+
+    # unpack query id, candidate document ids and scores, lambda weights, similarity and cache scope
+    query_id, rq, rq_doc_score, lambda_weights, similarity, cache_scope = query_args
+
+    # if similarities are cached per query, drop those of the previous query
+    if cache_scope == 'query':
+        shared_cache.clear()
+    # get similarity function of the candidate documents, once for every lambda weight
+    sim = get_sim(shared_store, rq, shared_vectors, similarity, shared_cache)
+
+    # list to hold run buffer of every lambda weight
+    buffers = [RunBuffer() for x in lambda_weights]
+    # for every lambda weight and its run buffer
+    for lambda_weight, buffer in zip(lambda_weights, buffers):
+        # calculate mmr
+        calc_mmr(query_id, rq, rq_doc_score, sim, lambda_weight, buffer)
+
+    # return run buffers
+    return buffers
 
 
 ########################################################################################################################
 
 
 # main function
-def main(lambda_weight):
+def main(collection_file, lambda_weights, similarity, cache_scope, cache_mb, workers, load):
 
-    # load docs
-    doc_vec, doc_term_ids = load_docs('input/document_term_vectors.dat')
+    # document store, tf-idf vectors and similarity cache shared with worker processes
+    global shared_store, shared_vectors, shared_cache
 
     # load results
-    qid_did_score, doc_ids, doc_score = load_results('output/final/question-1/bm25_b_0.75.txt')
-
-    # assign length of document vector to document vector length
-    doc_vec_len = len(doc_vec)
-    # create a counter of document term ids and assign it to document term ids counter
-    doc_term_ids_counter = Counter(doc_term_ids)
-    # calculate idf for every term, add it to an ordered dictionary and assign it to idf
-    idf = OrderedDict([(x, log10(doc_vec_len / doc_term_ids_counter[x])) for x in doc_term_ids])
-
-    # variable to hold start set to 0
-    start = 0
-    # variable to hold end set to 100
-    end = 100
+    _, doc_ids, doc_score = load_results('output/final/question-1/bm25_b_0.75.txt')
+
+    # if only the candidate documents are loaded
+    if load == 'candidates':
+        # load candidate docs
+        shared_store = load_doc_subset(collection_file, doc_ids)
+        # if collection is a binary collection
+        if collection_file.endswith('.bin'):
+            # map the collection and select the candidate documents' normalised tf-idf vectors and norms out of those
+            # persisted for every document, computing and persisting them and the collection statistics on first use
+            collection = load_doc_store(collection_file)
+            vectors = get_tf_idf_vectors(collection_file, collection, get_collection_stats(collection_file, collection))
+            shared_vectors = select_tf_idf_vectors(vectors, collection,
+                                                   [collection.doc_index(x) for x in shared_store.doc_ids])
+        else:
+            # calculate normalised tf-idf vectors and norms of the candidate documents, with the idf of the collection
+            # statistics, computing and persisting them on first use
+            shared_vectors = build_tf_idf_vectors(shared_store, get_collection_stats(collection_file))
+    else:
+        # load docs
+        shared_store = load_doc_store(collection_file)
+        # load normalised tf-idf vectors and norms of every document, computing and persisting them and the collection
+        # statistics on first use
+        shared_vectors = get_tf_idf_vectors(collection_file, shared_store, get_collection_stats(collection_file,
+                                                                                                shared_store))
+
+    # create similarity cache, bounded by memory cap - every worker process holds its own
+    shared_cache = SimilarityCache(cache_mb)
+
     # create a list with elements ranging between 201 and 250 and assign it to query ids
     query_ids = list(range(201, 251))
-    # for every query id
-    for query_id in query_ids:
-        # assign document ids ranging between start and end to rq
-        rq = doc_ids[start:end]
-        # calculate mmr
-        calc_mmr(query_id, qid_did_score[start:end], rq, doc_score[start:end], doc_vec, idf, lambda_weight)
-        # increment start by 100
-        start += 100
-        # increment end by 100
-        end += 100
+    # list to hold arguments of every query - candidate documents are 100 consecutive results
+    all_query_args = [(query_id, doc_ids[i * 100:(i + 1) * 100], doc_score[i * 100:(i + 1) * 100], lambda_weights,
+                       similarity, cache_scope) for i, query_id in enumerate(query_ids)]
+
+    # rerank every query, writing one run file per lambda weight
+    run_paths = ['output/temp/mmr_lambda_{:.2f}.txt'.format(x) for x in lambda_weights]
+    rerank_queries(all_query_args, rerank_query, run_paths, workers)
+    # if similarities were computed pair by pair in this process, print cache report
+    if similarity == 'pairwise' and workers <= 1:
+        print('{}\n'.format(shared_cache.report()))
 
 
 ########################################################################################################################
@@ -280,14 +241,28 @@ def main(lambda_weight):
 # runs main function
 if __name__ == '__main__':
 
-    # parse script argument
+    # parse script arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('-l', '--lambda', type=float, dest='lambda_', metavar='lambda weight value',
-                        help='lambda weight value', required=True)
+    parser.add_argument('-l', '--lambda', type=lambda x: [float(y) for y in x.split(',')], dest='lambda_',
+                        metavar='lambda weight values', help='comma separated lambda weight values', required=True)
+    parser.add_argument('-c', '--collection', type=str, dest='collection_', metavar='collection file',
+                        default='input/document_term_vectors.dat',
+                        help='text collection file, or binary collection file built by BuildCollection.py')
+    parser.add_argument('-s', '--similarity', type=str, dest='similarity_', choices=['matrix', 'pairwise'],
+                        default='matrix', help='compute candidate similarities as one matrix, or pair by pair')
+    parser.add_argument('--cache_scope', type=str, dest='cache_scope_', choices=['query', 'run'], default='run',
+                        help='keep pairwise similarities cached for one query, or for the whole run')
+    parser.add_argument('--cache_mb', type=float, dest='cache_mb_', metavar='cache size', default=64,
+                        help='memory cap of the pairwise similarity cache, in megabytes')
+    parser.add_argument('-w', '--workers', type=int, dest='workers_', metavar='number of workers', default=1,
+                        help='number of worker processes reranking queries in parallel')
+    parser.add_argument('--load', type=str, dest='load_', choices=['candidates', 'collection'], default='candidates',
+                        help='load only the documents of the bm25 run, or the whole collection')
     args = parser.parse_args()
 
-    # call main function with the script argument as parameter
-    main(args.lambda_)
+    # call main function with the script arguments as parameters
+    main(args.collection_, args.lambda_, args.similarity_, args.cache_scope_, args.cache_mb_, args.workers_,
+         args.load_)
 
 
 ########################################################################################################################
@@ -8,20 +8,25 @@
 
 
 # python packages
+import argparse
 from math import log2
+from operator import itemgetter
 from collections import OrderedDict
+from numpy import asarray, concatenate, cumsum
+
+# local packages
+from QrelsIndex import get_qrels
 
 
 ########################################################################################################################
 
 
-# loads results
-def load_results(input_file):
+# loads a run, grouping its results by query id in one pass - query id -> document ids in rank order, for every query
+# id in order of first appearance, whatever the depth of each query
+def load_run(input_file):
 
-    # list to hold data
-    qid_did = []
-    # list to hold query ids
-    query_ids = []
+    # dictionary to hold query id -> list of (document rank, document id)
+    run = OrderedDict()
 
     # open file
     with open(input_file) as input_file:
@@ -29,260 +34,106 @@ def load_results(input_file):
         for line in input_file:
             # split line into tokens
             tokens = line.strip(' \n').split(' ')
-            # assign first token to query id
-            query_id = tokens[0]
-            # if query id is not in query ids list
-            if query_id not in query_ids:
-                # add query id to query ids list
-                query_ids += [query_id]
-            # convert to int and assign fourth token to document rank
-            doc_rank = int(tokens[3])
-            # if document rank is less than 50
-            if doc_rank < 50:
-                # assign third token to document id
-                doc_id = tokens[2]
-                # concatenate query id and document id and assign to query id document id
-                qid_did_temp = ' '.join([query_id, doc_id])
-                # add temporary query id document id to query id document id list
-                qid_did += [qid_did_temp]
-
-    # return query id document id and query ids lists
-    return qid_did, query_ids
+            # skip blank lines
+            if not tokens[0]:
+                continue
+            # assign first token to query id, third token to document id and fourth token to document rank
+            query_id, doc_id, doc_rank = tokens[0], tokens[2], int(tokens[3])
+            # add document rank and document id to the results of query id
+            run.setdefault(query_id, []).append((doc_rank, doc_id))
+
+    # return query id -> document ids, sorted by document rank
+    return OrderedDict((query_id, [doc_id for doc_rank, doc_id in sorted(results, key=itemgetter(0))])
+                       for query_id, results in run.items())
 
 
 ########################################################################################################################
 
 
-# loads qrels
-def load_qrels(input_file):
+# calculates discount of every rank below a given depth, and ideal dcg of every number of relevant documents up to it
+def calc_discounts(depth):
 
-    # dictionary to hold document relevance
-    doc_rel = OrderedDict({})
+    # calculate discount of every rank
+    # method 1 - wikipedia - the first rank counts fully, the second is skipped, rank i after them counts 1 / log2(i)
+    discounts = [1.0, 0.0] + [1 / log2(i) for i in range(2, depth)]
+    # method 2 - microsoft research paper
+    # discounts = [1.0] + [1 / log2(i + 1) for i in range(1, depth)]
+    discounts = asarray(discounts[:depth])
 
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # split line into tokens
-            tokens = line.strip(' \n').split(' ')
-            # assign first token to query id
-            query_id = tokens[0]
-            # assign third token to document id
-            doc_id = tokens[2]
-            # assign fourth token to temporary document relevance
-            doc_rel_temp = int(tokens[3])
-            # concatenate query id and document id and assign to query id document id
-            qid_did = ' '.join([query_id, doc_id])
-            # add temporary document relevance to document relevance dictionary
-            doc_rel[qid_did] = doc_rel_temp
+    # calculate ideal dcg of c relevant documents - them ranked first - for c from 0 to depth
+    ideal_dcg = concatenate([[0.0, 1.0], 1.0 + concatenate([[0.0], cumsum(discounts[2:])])])[:depth + 1]
 
-    # return doc relevance
-    return doc_rel
+    # return discounts and ideal dcg
+    return discounts, ideal_dcg
 
 
 ########################################################################################################################
 
 
-# calculates ndcg
-def calc_ndcg(results, doc_rel, k, start, end):
+# calculates ndcg at every given cutoff in one pass over a query's ranked document ids, with the discounts and ideal
+# dcg of calc_discounts - the ideal ranking at cutoff k reorders the top k results, so ideal dcg only needs how many of
+# them are relevant
+def calc_ndcg(doc_ids, doc_grades, cutoffs, discounts, ideal_dcg):
 
-    # get document relevance scores for document ids between start and end
-    rels = [doc_rel.get(results[i]) if doc_rel.get(results[i]) is not None else 0 for i in range(start, end)]
+    # variable to hold depth, the highest cutoff
+    depth = max(cutoffs)
 
+    # get document relevance scores of the top results, 0 for unjudged documents and past the end of results
+    rels = [doc_grades.get(x, 0) for x in doc_ids[:depth]]
+    rels += [0] * (depth - len(rels))
     # if relevance score is greater than or equal to 1, rescale to 1, else 0 (binary)
-    rels = [1 if x >= 1 else 0 for x in rels]
+    rels = asarray([1.0 if x >= 1 else 0.0 for x in rels])
 
-    # sort relevance scores in descending order and assign to sorted relevance scores
-    sorted_rels = sorted(rels, reverse=True)
+    # calculate dcg at every depth k - first rank plus discounted gains of ranks 2 to k - 1
+    dcg = rels[0] + concatenate([[0.0, 0.0, 0.0], cumsum(rels[2:] * discounts[2:depth])])
+    # calculate number of relevant documents in the top k, and ideal dcg, at every depth k
+    rel_counts = concatenate([[0], cumsum(rels)]).astype(int)
+    idcg = ideal_dcg[rel_counts]
 
-    # assign first relevance score to relevance score 1
-    rel1 = rels[0]
-    # assign first sorted relevance score to sorted relevance score 1
-    sorted_rel1 = sorted_rels[0]
+    # return ndcg at every cutoff, 0.0 where dcg is 0
+    return [float(dcg[k] / idcg[k]) if dcg[k] != 0 else 0.0 for k in cutoffs]
+
+
+########################################################################################################################
 
-    # calculate dcg fraction
-    # method 1 - wikipedia
-    dcg_fraction = sum([(rels[i] / log2(i)) for i in range(2, k)])
-    # method 2 - microsoft research paper
-    # dcg_fraction = sum([(rels[i] / log2(i + 1)) for i in range(1, k)])
-    # calculate idcg fraction
-    # method 1 - wikipedia
-    idcg_fraction = sum([(sorted_rels[i] / log2(i)) for i in range(2, k)])
-    # method 2 - microsoft research paper
-    # idcg_fraction = sum([(sorted_rels[i] / log2(i + 1)) for i in range(1, k)])
 
-    # calculate dcg
-    dcg = rel1 + dcg_fraction
-    # calculate idcg
-    idcg = sorted_rel1 + idcg_fraction
+# calculates average ndcg at every given cutoff, for a run held in memory as a list of (query id, ranked document ids)
+def calc_avg_ndcg(run, qrels, cutoffs):
 
-    # set ndcg to 0.0
-    ndcg = 0.0
+    # calculate discounts and ideal dcg once, for every query
+    discounts, ideal_dcg = calc_discounts(max(cutoffs))
+    # list to hold ndcg at every cutoff
+    all_ndcg = [0.0 for _ in cutoffs]
 
-    # if dcg and idcg are not equal to 0 or 0.0
-    if dcg and idcg != 0 or 0.0:
-        # calculate ndcg
-        ndcg = dcg / idcg
+    # for every query id and ranked document ids
+    for query_id, doc_ids in run:
+        # calculate ndcg at every cutoff against the grades of the query, and add it to all ndcg
+        ndcg = calc_ndcg(doc_ids, qrels.query_grades(query_id), cutoffs, discounts, ideal_dcg)
+        all_ndcg = [x + y for x, y in zip(all_ndcg, ndcg)]
 
-    # return ndcg
-    return ndcg
+    # return average ndcg at every cutoff
+    return [x / len(run) for x in all_ndcg]
 
 
 ########################################################################################################################
 
 
 # main function
-def main():
-
-    # load results
-    results, query_ids = load_results('input/BM25b0.75_0.res')
-    # load qrels
-    doc_rel = load_qrels('input/qrels.adhoc.txt')
-
-    # assign length of query ids to query ids length
-    query_ids_len = len(query_ids)
-    # list to hold ndcg at k in (1, 5, 10, 20, 30, 40, 50)
-    all_ndcg = [0.0 for _ in range(7)]
-
-    # for every query id
-    for query_id in query_ids:
-        # convert query id to int and assign to query id
-        query_id = int(query_id)
-        # convert first query id to int and assign to query id 1
-        query_id1 = int(query_ids[0])
-
-        # loop from 0 to 1, 5, 10, 20, 30, 40, 50
-        for k in (1, 5, 10, 20, 30, 40, 50):
-            # set i to 0
-            i = 0
-            # if k equals 1, i equals 0
-            if k == 1:
-                i = 0
-            # else if k equals 5, i equals 1
-            elif k == 5:
-                i = 1
-            # else if k equals 10, i equals 2
-            elif k == 10:
-                i = 2
-            # else if k equals 20, i equals 3
-            elif k == 20:
-                i = 3
-            # else if k equals 30, i equals 4
-            elif k == 30:
-                i = 4
-            # else if k equals 40, i equals 5
-            elif k == 40:
-                i = 5
-            # else if k equals 50, i equals 6
-            elif k == 50:
-                i = 6
-
-            """
-                query ids 219 and 241 are missing from the results
-                file provided which affects the incremental progress
-                through the results.
-
-                for example:
-
-                query_id = 218, k = 5
-                start = 50 * (218 - 201) = 50 * 17 = 850
-                end = start + k = 850 + 5 = 855
-                loop: from 850 to 855
-
-                this works for query ids less than 219.
-
-                #######################################################
-
-                query_id = 220, k = 5
-                start = 50 * (220 - 201) = 50 * 19 = 950
-                end = start + k = 950 + 5 = 955
-                loop: from 950 to 955
-
-                it doesn't work anymore for query ids over 219,
-                as we are not considering 50 documents, from 900
-                to 950 in this case.
-
-                #######################################################
-
-                to fix it, we do the following:
-
-                query_id = 220, k = 5
-                start = 50 * (220 - 201 - 1) = 50 * 18 = 900
-                end = start + k = 900 + 5 = 905
-                loop: from 900 to 905
-
-                #######################################################
-
-                we also fix 241 in a similar way, except we minus by
-                2 instead of 1:
-
-                query_id = 240, k = 5
-                start = 50 * (240 - 201 - 1) = 50 * 38 = 1900
-                end = start + k = 1900 + 5 = 1905
-                loop: from 1900 to 1905
-
-                this works for query ids greater than 219 and less
-                than 241.
-
-                #######################################################
-
-                query_id = 242, k = 5
-                start = 50 * (242 - 201 - 1) = 50 * 40 = 2000
-                end = start + k = 2000 + 5 = 2005
-                loop: from 2000 to 2005
-
-                it doesn't work anymore for query ids over 241,
-                as we are not considering 50 documents, from 1950
-                to 2000 in this case.
-
-                #######################################################
-
-                to fix it, we do the following:
-
-                query_id = 242, k = 5
-                start = 50 * (242 - 201 - 2) = 50 * 39 = 1950
-                end = start + k = 1950 + 5 = 1955
-                loop: from 1950 to 1955
-            """
-            if query_id < 219:
-                start = 50 * (query_id - query_id1)
-            elif 219 < query_id < 241:
-                start = 50 * (query_id - query_id1 - 1)
-            else:
-                start = 50 * (query_id - query_id1 - 2)
-            end = start + k
-
-            # calculate ndcg and return output in ndcg
-            ndcg = calc_ndcg(results, doc_rel, k, start, end)
-            # add ndcg to average ndcg
-            all_ndcg[i] += ndcg
-
-    # calculate average ndcg @ k = 1
-    avg_ndcg_k1 = all_ndcg[0] / query_ids_len
-    # calculate average ndcg @ k = 5
-    avg_ndcg_k5 = all_ndcg[1] / query_ids_len
-    # calculate average ndcg @ k = 10
-    avg_ndcg_k10 = all_ndcg[2] / query_ids_len
-    # calculate average ndcg @ k = 20
-    avg_ndcg_k20 = all_ndcg[3] / query_ids_len
-    # calculate average ndcg @ k = 30
-    avg_ndcg_k30 = all_ndcg[4] / query_ids_len
-    # calculate average ndcg @ k = 40
-    avg_ndcg_k40 = all_ndcg[5] / query_ids_len
-    # calculate average ndcg @ k = 50
-    avg_ndcg_k50 = all_ndcg[6] / query_ids_len
-
-    # write ndcg @ k in (1, 5, 10, 20, 30, 40, 50) to file
-    with open('output/temp/bm25_ndcg.txt', mode='w') as results_file:
-        results_file.write('bm25\n')
+def main(run_file, qrels_file, output_file, run_name, cutoffs):
+
+    # load run, grouped by query id
+    run = load_run(run_file)
+    # load qrels index
+    qrels = get_qrels(qrels_file)
+
+    # calculate average ndcg at every cutoff over the queries of the run
+    avg_ndcg = calc_avg_ndcg(list(run.items()), qrels, cutoffs)
+
+    # write ndcg @ k at every cutoff to file
+    with open(output_file, mode='w') as results_file:
+        results_file.write('{}\n'.format(run_name))
         results_file.write('K\t|\tNDCG@K\n')
-        results_file.write('1\t|\t{0:.3f}\n'.format(avg_ndcg_k1))
-        results_file.write('5\t|\t{0:.3f}\n'.format(avg_ndcg_k5))
-        results_file.write('10\t|\t{0:.3f}\n'.format(avg_ndcg_k10))
-        results_file.write('20\t|\t{0:.3f}\n'.format(avg_ndcg_k20))
-        results_file.write('30\t|\t{0:.3f}\n'.format(avg_ndcg_k30))
-        results_file.write('40\t|\t{0:.3f}\n'.format(avg_ndcg_k40))
-        results_file.write('50\t|\t{0:.3f}'.format(avg_ndcg_k50))
+        results_file.write('\n'.join('{}\t|\t{:.3f}'.format(k, x) for k, x in zip(cutoffs, avg_ndcg)))
     # print progress
     print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
 
@@ -292,7 +143,23 @@ def main():
 
 # runs main function
 if __name__ == '__main__':
-    main()
+
+    # parse script arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--run', type=str, dest='run_', metavar='run file', default='input/BM25b0.75_0.res',
+                        help='run file in standard TREC format')
+    parser.add_argument('-q', '--qrels', type=str, dest='qrels_', metavar='qrels file', default='input/qrels.adhoc.txt',
+                        help='qrels file')
+    parser.add_argument('-o', '--output', type=str, dest='output_', metavar='output file',
+                        default='output/temp/bm25_ndcg.txt', help='ndcg results file')
+    parser.add_argument('-n', '--name', type=str, dest='name_', metavar='run name', default='bm25',
+                        help='run name written at the top of the results file')
+    parser.add_argument('--cutoffs', type=lambda x: [int(y) for y in x.split(',')], dest='cutoffs_',
+                        metavar='ndcg cutoffs', default=[1, 5, 10, 20, 30, 40, 50], help='comma separated ndcg cutoffs')
+    args = parser.parse_args()
+
+    # call main function with the script arguments as parameters
+    main(args.run_, args.qrels_, args.output_, args.name_, args.cutoffs_)
 
 
 ########################################################################################################################
@@ -11,50 +11,14 @@
 
 # python packages
 import argparse
-from numpy import cov, std
-from collections import OrderedDict
+from math import sqrt
+from numpy import zeros
 
-
-########################################################################################################################
-
-
-# loads docs
-def load_docs(input_file):
-
-    # list to hold unique docs
-    unique_doc_ids = []
-    # list to hold document vector
-    doc_vec = []
-    # list to hold document term ids
-    doc_term_ids = []
-
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # if document id is not in unique docs
-            if line.split(' ')[0] not in unique_doc_ids:
-                # add document id to unique documents list
-                unique_doc_ids += [line.split(' ')[0]]
-                # split line into tokens
-                tokens = line.strip(' \n').split(' ')
-                # assign first token to document id
-                doc_id = tokens[0]
-                # list to hold temporary document vector
-                doc_vec_temp = []
-                # for every token except the first one
-                for token in tokens[1:]:
-                    # split token
-                    token = token.split(':')
-                    # add first token to document term ids
-                    doc_term_ids += [int(token[0])]
-                    # add first and second token to temporary document vector
-                    doc_vec_temp += [(int(token[0]), int(token[1]))]
-                # add document id and temporary document vector to document vector list
-                doc_vec += [(doc_id, doc_vec_temp)]
-
-    # return document vector and document term ids
-    return doc_vec, doc_term_ids
+# local packages
+from DocLoader import load_doc_store, load_doc_subset
+from RunWriter import RunBuffer
+from SimilarityMatrix import build_candidate_matrix, calc_pearson_matrix
+from GreedyReranker import rerank, rerank_queries, matrix_column, pairwise_column
 
 
 ########################################################################################################################
@@ -98,33 +62,40 @@ def load_results(input_file):
 ########################################################################################################################
 
 
-# dictionary to hold rq dq term frequency memoize
-rq_dq_term_freq_memoize = {}
+# calculates pearson's correlation coefficient between two given documents, over the term frequencies of the terms
+# they share - 0.0 if they share fewer than two terms or either is constant over them
+def calc_pxy(rq_doc_vec, dq_doc_vec):
 
+    # assign intersection of rq document vector and dq document vector to intersection
+    intersection = sorted(rq_doc_vec.keys() & dq_doc_vec.keys())
+    # assign length of intersection to n
+    n = len(intersection)
 
-# calculates pearson's correlation coefficient between two given documents
-def calc_pxy(rq_doc_id, dq_doc_id, rq_doc_vec, dq_doc_vec):
+    # if covariance is undefined, return 0.0
+    if n < 2:
+        return 0.0
 
-    # concatenate rq and dq document id and assign to rq dq document id
-    rq_dq_doc_id = ' '.join([rq_doc_id, dq_doc_id])
+    # assign rq and dq document term frequencies of the shared term ids, aligned, to rq and dq term frequency vector
+    rq_term_freq_vector = [rq_doc_vec.get(x) for x in intersection]
+    dq_term_freq_vector = [dq_doc_vec.get(x) for x in intersection]
 
-    # if rq dq document id is not in rq dq term frequency memoize
-    if rq_dq_doc_id not in rq_dq_term_freq_memoize:
-        # assign rq and dq document vector values to rq and dq document term frequency if term ids appear in both
-        rq_doc_term_freq = [rq_doc_vec.get(x) for x in rq_doc_vec.keys() if x in dq_doc_vec.keys()]
-        dq_doc_term_freq = [dq_doc_vec.get(x) for x in dq_doc_vec.keys() if x in rq_doc_vec.keys()]
-        # add rq and dq document term frequency to rq dq term frequency memoize
-        rq_dq_term_freq_memoize[rq_dq_doc_id] = (rq_doc_term_freq, dq_doc_term_freq)
+    # calculate mean of rq and dq term frequency vector
+    rq_mean = sum(rq_term_freq_vector) / n
+    dq_mean = sum(dq_term_freq_vector) / n
+    # calculate sum of squared deviations of rq and dq, and sum of products of their deviations
+    rq_sq_dev = sum([(x - rq_mean) ** 2 for x in rq_term_freq_vector])
+    dq_sq_dev = sum([(y - dq_mean) ** 2 for y in dq_term_freq_vector])
+    rq_dq_dev = sum([(x - rq_mean) * (y - dq_mean) for x, y in zip(rq_term_freq_vector, dq_term_freq_vector)])
 
-    # get rq and dq term frequency vector
-    rq_term_freq_vector = rq_dq_term_freq_memoize.get(rq_dq_doc_id)[0]
-    dq_term_freq_vector = rq_dq_term_freq_memoize.get(rq_dq_doc_id)[1]
+    # if either document is constant over the shared terms, standard deviation is 0.0, return 0.0
+    if rq_sq_dev == 0 or dq_sq_dev == 0:
+        return 0.0
 
-    # calculate covariance
-    covariance = cov(rq_term_freq_vector, dq_term_freq_vector)[0][1]
+    # calculate covariance, with n - 1
+    covariance = rq_dq_dev / (n - 1)
 
-    # calculate standard deviation
-    standard_deviation = (std(rq_term_freq_vector) * std(dq_term_freq_vector))
+    # calculate standard deviation, with n
+    standard_deviation = sqrt(rq_sq_dev / n) * sqrt(dq_sq_dev / n)
 
     # calculate pearson's correlation coefficient
     pxy = covariance / standard_deviation
@@ -136,121 +107,125 @@ def calc_pxy(rq_doc_id, dq_doc_id, rq_doc_vec, dq_doc_vec):
 ########################################################################################################################
 
 
-# calculates mva and ranks 100 given documents at a time
-def calc_mva(query_id, qid_did_score, rq, doc_score, doc_vec, b):
+# returns pearson's correlation coefficient column function of the candidate documents of a query - 'matrix' computes
+# every pair at once, 'pairwise' calls calc_pxy for every pair visited
+def get_pxy(store, doc_ids, similarity):
 
-    # assign first token of document score to max score
-    max_score = max(doc_score)
-    # assign first token of rq to dq
-    dq = [rq[0]]
-    # remove first token of dq from rq
-    rq.remove(dq[0])
+    # if similarity is computed as a matrix
+    if similarity == 'matrix':
+        # build candidate term frequency matrix, calculate pearson's correlation coefficient of every pair and return
+        # matrix lookup
+        term_ids, tf = build_candidate_matrix(store, doc_ids)
+        return matrix_column(calc_pearson_matrix(tf))
 
-    # open file
-    with open('output/temp/portfolio_b_{}.txt'.format(b), mode='a') as results_file:
-        # write results in standard TREC format
-        results_file.write('{} Q0 {} 0 {} bm25_b_0.75\n'.format(query_id, dq[0], max_score, b))
-
-    # create dictionary of query id document id score and assign it to query id document id score
-    qid_did_score = dict(qid_did_score)
-    # create dictionary of document vector and assign it to document vector
-    doc_vec = dict(doc_vec)
-
-    # assign length of rq to rq length
-    rq_len = len(rq)
-    # print progress
-    print('query id {} - scored 0 out of {} documents'.format(query_id, rq_len + 1))
-    # variable to hold document rank set to 1
-    doc_rank = 1
-    # variable to hold print progress set to 1
-    print_progress = 1
-    # loop from 0 to rq length
-    for i in range(0, rq_len):
-        # variable to hold highest mva set to null
-        high_mva = None
-        # variable to hold highest mva document set to null
-        high_mva_doc_id = None
-        # open file
-        with open('output/temp/portfolio_b_{}.txt'.format(b), mode='a') as results_file:
-            # for every rq document id
-            for rq_doc_id in rq:
-                # for every dq document id
-                for dq_doc_id in dq:
-                    # assign rq document vector to rq document vector
-                    rq_doc_vec = doc_vec.get(rq_doc_id)
-                    # assign dq document vector to dq document vector
-                    dq_doc_vec = doc_vec.get(dq_doc_id)
-                    # concatenate query id and rq document id and assign to query id document id
-                    qid_did = ' '.join([str(query_id), rq_doc_id])
-                    # assign query id document id score to rq document score
-                    rq_doc_score = qid_did_score.get(qid_did)
-                    # normalize bm25 score
-                    norm_bm25_score = rq_doc_score / max_score
-                    # calculate pearson's correlation coefficient
-                    p_x_y = calc_pxy(rq_doc_id, dq_doc_id, OrderedDict(rq_doc_vec), OrderedDict(dq_doc_vec))
-                    # calculate mva
-                    mva = norm_bm25_score - b * i - 2 * b * p_x_y
-                    # if high mva is null:
-                    if high_mva is None:
-                        # assign mva to high mva
-                        high_mva = mva
-                        # assign rq document id to high mva document id
-                        high_mva_doc_id = rq_doc_id
-                    # if mva is greater than high mva:
-                    if mva > high_mva:
-                        # assign mva to high mva
-                        high_mva = mva
-                        # assign rq document id to high mva document id
-                        high_mva_doc_id = rq_doc_id
-
-            # add high mva document id to dq
-            dq += [high_mva_doc_id]
-            # write results in standard TREC format
-            results_file.write('{} Q0 {} {} {} portfolio_b_{}\n'.format(query_id, high_mva_doc_id, doc_rank, high_mva, b))
-            # increment document rank
-            doc_rank += 1
-            # print progress
-            print('query id {} - scored {} out of {} documents'.format(query_id, print_progress, rq_len + 1))
-            # increment print progress
-            print_progress += 1
-            # remove high mva document id from rq
-            rq.remove(high_mva_doc_id)
-
-    # print progress
-    print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
-
-    # return
-    return
+    # get document vector of every candidate document from the document store, once per query
+    doc_vec = {x: dict(store.doc_vec(store.doc_index(x))) for x in doc_ids}
+    # return pairwise calculation
+    return pairwise_column(doc_ids, lambda rq_doc_id, dq_doc_id: calc_pxy(doc_vec.get(rq_doc_id),
+                                                                          doc_vec.get(dq_doc_id)))
+
+
+########################################################################################################################
+
+
+# mean-variance objective - normalised bm25 score - b * i - 2 * b * accumulated correlation with the selected documents,
+# where i is the number of documents selected after the top bm25 document
+class MeanVarianceObjective(object):
+
+    def __init__(self, b):
+
+        # b param
+        self.b = b
+        # run tag
+        self.run_tag = 'portfolio_b_{}'.format(b)
+        # normalised bm25 score of every candidate
+        self.relevance = None
+        # accumulated pearson's correlation coefficient of every candidate with the selected documents
+        self.sum_pxy = None
+
+    # starts objective for a query's candidates
+    def start(self, relevance):
+
+        # assign normalised bm25 scores, no correlation yet
+        self.relevance = relevance
+        self.sum_pxy = zeros(len(relevance))
+
+    # returns mva of every candidate
+    def scores(self, doc_rank):
+
+        # return mva
+        return self.relevance - self.b * (doc_rank - 1) - 2 * self.b * self.sum_pxy
+
+    # adds correlation of given candidates with a newly selected document to their accumulated correlation
+    def update(self, selected, candidates, pxy):
+
+        # accumulate correlation
+        self.sum_pxy[candidates] += pxy
+
+
+########################################################################################################################
+
+
+# calculates mva and ranks 100 given documents at a time - every candidate's risk is its correlation with the whole
+# selected portfolio, accumulated as the portfolio grows
+def calc_mva(query_id, rq, doc_score, pxy, b, results_file):
+
+    # rerank documents with the mean-variance objective
+    rerank(query_id, rq, doc_score, pxy, MeanVarianceObjective(b), results_file, 'bm25_b_0.75')
+
+
+########################################################################################################################
+
+
+# document store read by rerank_query - set before rerank_queries forks workers
+shared_store = None
+
+
+# calculates mva of a single query's candidate documents for every b param, returning one run buffer per b param
+def rerank_query(query_args):
+
+    # unpack query id, candidate document ids and scores, b params and similarity
+    query_id, rq, rq_doc_score, b_values, similarity = query_args
+
+    # get pearson's correlation coefficient function of the candidate documents, once for every b param
+    pxy = get_pxy(shared_store, rq, similarity)
+
+    # list to hold run buffer of every b param
+    buffers = [RunBuffer() for x in b_values]
+    # for every b param and its run buffer
+    for b, buffer in zip(b_values, buffers):
+        # calculate mva
+        calc_mva(query_id, rq, rq_doc_score, pxy, b, buffer)
+
+    # return run buffers
+    return buffers
 
 
 ########################################################################################################################
 
 
 # main function
-def main(b):
+def main(collection_file, b_values, similarity, workers, load):
 
-    # load docs
-    doc_vec, doc_term_ids = load_docs('input/document_term_vectors.dat')
+    # document store shared with worker processes
+    global shared_store
 
     # load results
-    qid_did_score, doc_ids, doc_score = load_results('output/final/question-1/bm25_b_0.75.txt')
+    _, doc_ids, doc_score = load_results('output/final/question-1/bm25_b_0.75.txt')
+
+    # load candidate docs only, or all docs
+    shared_store = (load_doc_subset(collection_file, doc_ids) if load == 'candidates'
+                    else load_doc_store(collection_file))
 
-    # variable to hold start set to 0
-    start = 0
-    # variable to hold end set to 100
-    end = 100
     # create a list with elements ranging between 201 and 250 and assign it to query ids
     query_ids = list(range(201, 251))
-    # for every query id
-    for query_id in query_ids:
-        # assign document ids ranging between start and end to rq
-        rq = doc_ids[start:end]
-        # calculate mva
-        calc_mva(query_id, qid_did_score[start:end], rq, doc_score[start:end], doc_vec, b)
-        # increment start by 100
-        start += 100
-        # increment end by 100
-        end += 100
+    # list to hold arguments of every query - candidate documents are 100 consecutive results
+    all_query_args = [(query_id, doc_ids[i * 100:(i + 1) * 100], doc_score[i * 100:(i + 1) * 100], b_values,
+                       similarity) for i, query_id in enumerate(query_ids)]
+
+    # rerank every query, writing one run file per b param
+    run_paths = ['output/temp/portfolio_b_{}.txt'.format(x) for x in b_values]
+    rerank_queries(all_query_args, rerank_query, run_paths, workers)
 
 
 ########################################################################################################################
@@ -259,14 +234,25 @@ def main(b):
 # runs main function
 if __name__ == '__main__':
 
-    # parse script argument
+    # parse script arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('-b', '--b_param', type=int, dest='b_param_', metavar='b param value',
-                        help='b param value', required=True)
+    parser.add_argument('-b', '--b_param', type=lambda x: [int(y) for y in x.split(',')], dest='b_param_',
+                        metavar='b param values', required=True,
+                        help='comma separated b param values - a list starting with a negative value is passed as '
+                             '--b_param=-4,4')
+    parser.add_argument('-c', '--collection', type=str, dest='collection_', metavar='collection file',
+                        default='input/document_term_vectors.dat',
+                        help='text collection file, or binary collection file built by BuildCollection.py')
+    parser.add_argument('-s', '--similarity', type=str, dest='similarity_', choices=['matrix', 'pairwise'],
+                        default='matrix', help='compute candidate correlations as one matrix, or pair by pair')
+    parser.add_argument('-w', '--workers', type=int, dest='workers_', metavar='number of workers', default=1,
+                        help='number of worker processes reranking queries in parallel')
+    parser.add_argument('--load', type=str, dest='load_', choices=['candidates', 'collection'], default='candidates',
+                        help='load only the documents of the bm25 run, or the whole collection')
     args = parser.parse_args()
 
-    # call main function with the script argument as parameter
-    main(args.b_param_)
+    # call main function with the script arguments as parameters
+    main(args.collection_, args.b_param_, args.similarity_, args.workers_, args.load_)
 
 
 ########################################################################################################################
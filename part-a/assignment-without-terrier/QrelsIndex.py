@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Qrels index shared by every metric - query id -> document id -> grade, and query id -> document id -> intent -> grade
+# for the subtopic judgements of qrels.ndeval.txt - parsed once from lines 'query_id intent doc_id grade' and cached
+# next to the qrels file as '<qrels file>.pkl'
+
+########################################################################################################################
+
+
+# python packages
+from sys import intern
+from pickle import dump, load, HIGHEST_PROTOCOL
+
+# local packages
+from FileCache import cache_file_path, get_cached
+
+
+########################################################################################################################
+
+
+# qrels index object
+class QrelsIndex(object):
+
+    __slots__ = ('grades', 'intents')
+
+    def __init__(self, query_ids, intents, doc_ids, grades):
+
+        # query id -> document id -> grade of the last judgement of the document
+        self.grades = {}
+        # query id -> document id -> intent -> grade
+        self.intents = {}
+
+        # for every judgement, with interned ids
+        for query_id, intent, doc_id, grade in zip(query_ids, intents, doc_ids, grades):
+            query_id, doc_id = intern(query_id), intern(doc_id)
+            # add grade of document, and grade of document for intent
+            self.grades.setdefault(query_id, {})[doc_id] = grade
+            self.intents.setdefault(query_id, {}).setdefault(doc_id, {})[intent] = grade
+
+    # returns document id -> grade of a given query id, empty if the query has no judgements
+    def query_grades(self, query_id):
+
+        # return grades
+        return self.grades.get(query_id, {})
+
+    # returns document id -> intent -> grade of a given query id, empty if the query has no judgements
+    def query_intents(self, query_id):
+
+        # return intent grades
+        return self.intents.get(query_id, {})
+
+
+########################################################################################################################
+
+
+# reads qrels file into query id, intent, document id and grade columns
+def read_qrels(input_file):
+
+    # lists to hold query ids, intents, document ids and grades
+    query_ids, intents, doc_ids, grades = [], [], [], []
+
+    # open file
+    with open(input_file) as input_file:
+        # for every line in input file
+        for line in input_file:
+            # split line into tokens
+            tokens = line.strip(' \n').split(' ')
+            # skip blank lines
+            if not tokens[0]:
+                continue
+            # add query id, intent, document id and grade
+            query_ids += [tokens[0]]
+            intents += [int(tokens[1])]
+            doc_ids += [tokens[2]]
+            grades += [int(tokens[3])]
+
+    # return columns
+    return query_ids, intents, doc_ids, grades
+
+
+########################################################################################################################
+
+
+# returns path of the cache file of a given qrels file
+def qrels_cache_path(qrels_file):
+
+    # return full qrels file path, plus cache extension
+    return cache_file_path(qrels_file, '.pkl')
+
+
+########################################################################################################################
+
+
+# saves qrels index - pickled as it is, so loading restores its dictionaries without parsing or rebuilding them
+def save_qrels(qrels, output_file):
+
+    # open file
+    with open(output_file, mode='wb') as output_file:
+        # write qrels index
+        dump(qrels, output_file, protocol=HIGHEST_PROTOCOL)
+
+
+########################################################################################################################
+
+
+# loads qrels index
+def load_qrels(input_file):
+
+    # open file
+    with open(input_file, mode='rb') as input_file:
+        # return qrels index
+        return load(input_file)
+
+
+########################################################################################################################
+
+
+# returns qrels index of a qrels file, loading its cache if up to date and a qrels index, else parsing the file and
+# caching it
+def get_qrels(qrels_file):
+
+    # return qrels index
+    return get_cached(qrels_file, qrels_cache_path(qrels_file), load_qrels, lambda: QrelsIndex(*read_qrels(qrels_file)),
+                      save_qrels, lambda qrels: isinstance(qrels, QrelsIndex))
+
+
+########################################################################################################################
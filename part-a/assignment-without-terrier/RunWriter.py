@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Buffered writer of runs in standard TREC format - lines go to a temporary file through one handle, which replaces
+# the run file only once the run is complete, so reruns never append onto stale output
+
+########################################################################################################################
+
+
+# python packages
+from os import remove, replace
+
+
+########################################################################################################################
+
+
+# run writer object
+class RunWriter(object):
+
+    def __init__(self, output_file, buffer_size=1 << 20):
+
+        # path of run file
+        self.name = output_file
+        # path of temporary file, in the same directory so the final rename is atomic
+        self.temp_name = '{}.tmp'.format(output_file)
+        # buffered handle of temporary file
+        self.temp_file = open(self.temp_name, mode='w', buffering=buffer_size)
+
+    # writes a result in standard TREC format
+    def write(self, query_id, doc_id, doc_rank, doc_score, run_tag):
+
+        # write result line
+        self.temp_file.write('{} Q0 {} {} {} {}\n'.format(query_id, doc_id, doc_rank, doc_score, run_tag))
+
+    # writes a ranked list of (document id, document score) of a query, starting at a given rank
+    def write_results(self, query_id, results, run_tag, start_rank=0):
+
+        # for every document rank, document id and document score
+        for doc_rank, (doc_id, doc_score) in enumerate(results, start_rank):
+            # write result line
+            self.write(query_id, doc_id, doc_rank, doc_score, run_tag)
+
+    # writes every result held by a run buffer
+    def write_buffer(self, buffer):
+
+        # for every result
+        for query_id, doc_id, doc_rank, doc_score, run_tag in buffer.lines:
+            # write result line
+            self.write(query_id, doc_id, doc_rank, doc_score, run_tag)
+
+    # closes temporary file and moves it over the run file
+    def close(self):
+
+        # close temporary file, flushing the buffer
+        self.temp_file.close()
+        # replace run file with temporary file
+        replace(self.temp_name, self.name)
+
+    # closes temporary file and deletes it, leaving any previous run file untouched
+    def discard(self):
+
+        # close and delete temporary file
+        self.temp_file.close()
+        remove(self.temp_name)
+
+    def __enter__(self):
+
+        # return run writer
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        # if run completed, publish it, else throw it away
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+########################################################################################################################
+
+
+# run buffer object - holds results in memory, for a worker process to hand back to the run writer
+class RunBuffer(object):
+
+    def __init__(self):
+
+        # list to hold (query id, document id, document rank, document score, run tag)
+        self.lines = []
+
+    # adds a result
+    def write(self, query_id, doc_id, doc_rank, doc_score, run_tag):
+
+        # add result
+        self.lines += [(query_id, doc_id, doc_rank, doc_score, run_tag)]
+
+
+########################################################################################################################
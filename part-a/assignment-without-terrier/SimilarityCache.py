@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Bounded least-recently-used cache of pairwise document similarities - similarities are symmetric, so a pair is keyed
+# and calculated as (lower document id, higher document id) whichever way round it is looked up
+
+########################################################################################################################
+
+
+# python packages
+from collections import OrderedDict
+
+
+########################################################################################################################
+
+
+# approximate memory held by one entry - key tuple, two id references, float value and ordered dictionary links
+ENTRY_BYTES = 200
+
+
+########################################################################################################################
+
+
+# similarity cache object
+class SimilarityCache(object):
+
+    def __init__(self, max_mb=64):
+
+        # maximum number of entries, from memory cap
+        self.max_entries = max(1, int(max_mb * (1 << 20)) // ENTRY_BYTES)
+        # ordered dictionary to hold (lower document id, higher document id) -> similarity, least recently used first
+        self.entries = OrderedDict()
+        # number of lookups found in the cache
+        self.hits = 0
+        # number of lookups computed
+        self.misses = 0
+        # number of entries evicted
+        self.evictions = 0
+
+    # returns similarity of a document id pair, calling calc(lower document id, higher document id) on a miss
+    def get(self, rq_doc_id, dq_doc_id, calc):
+
+        # variable to hold key, the same for both orders of the pair
+        key = (min(rq_doc_id, dq_doc_id), max(rq_doc_id, dq_doc_id))
+
+        # if key is cached
+        if key in self.entries:
+            # increment hits
+            self.hits += 1
+            # mark key as most recently used
+            self.entries.move_to_end(key)
+            # return cached similarity
+            return self.entries[key]
+
+        # increment misses
+        self.misses += 1
+        # calculate similarity, in key order so it does not depend on which order was looked up first
+        sim = calc(*key)
+        # cache it
+        self.entries[key] = sim
+        # if cache is over capacity
+        if len(self.entries) > self.max_entries:
+            # evict least recently used entry
+            self.entries.popitem(last=False)
+            # increment evictions
+            self.evictions += 1
+
+        # return similarity
+        return sim
+
+    # empties the cache, keeping its counters
+    def clear(self):
+
+        # remove every entry
+        self.entries.clear()
+
+    # returns a one-line report of the cache counters
+    def report(self):
+
+        # variable to hold number of lookups
+        lookups = self.hits + self.misses
+
+        # return report
+        return 'similarity cache - {} lookups, {} hits ({:.1%}), {} misses, {} evictions, {} of {} entries used'.format(
+            lookups, self.hits, self.hits / lookups if lookups else 0.0, self.misses, self.evictions,
+            len(self.entries), self.max_entries)
+
+
+########################################################################################################################
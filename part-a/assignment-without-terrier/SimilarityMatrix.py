@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Candidate similarity matrices for reranking - a query's candidate documents are laid out once as a documents x terms
+# matrix, dense term frequencies or sparse precomputed tf-idf vectors, and every pairwise similarity is computed from
+# it with matrix products
+
+########################################################################################################################
+
+
+# python packages
+from numpy import asarray, concatenate, cumsum, divide, outer, searchsorted, sqrt, unique, zeros, zeros_like
+from scipy.sparse import csr_matrix
+
+
+########################################################################################################################
+
+
+# builds the term frequency matrix of the given documents, documents x terms, over the union of their terms
+def build_candidate_matrix(store, doc_ids):
+
+    # get term ids and term frequencies of every document
+    terms = [store.terms(store.doc_index(x)) for x in doc_ids]
+    # get union of term ids, ascending
+    term_ids = unique(concatenate([x[0] for x in terms])) if terms else asarray([], dtype=int)
+
+    # matrix to hold term frequencies
+    tf = zeros((len(doc_ids), len(term_ids)))
+    # for every row and document term ids and term frequencies
+    for row, (doc_term_ids, doc_term_freqs) in enumerate(terms):
+        # place term frequencies in the columns of their term ids
+        tf[row, searchsorted(term_ids, doc_term_ids)] = doc_term_freqs
+
+    # return term ids and term frequency matrix
+    return term_ids, tf
+
+
+########################################################################################################################
+
+
+# calculates cosine similarity of every pair of the given documents, as defined by MMRScoring.calc_sim - tf-idf dot
+# product over raw term frequency norms - from their precomputed normalised tf-idf vectors, with one sparse product
+def calc_cosine_matrix(store, vectors, doc_ids):
+
+    # get document index of every document
+    doc_indexes = [store.doc_index(x) for x in doc_ids]
+    # get term ids and normalised tf-idf weights of every document
+    doc_vectors = [vectors.vector(store, x) for x in doc_indexes]
+
+    # lay out normalised tf-idf vectors as a sparse documents x terms matrix
+    offsets = concatenate([[0], cumsum([len(x[0]) for x in doc_vectors])])
+    term_ids = concatenate([x[0] for x in doc_vectors]) if doc_vectors else asarray([], dtype=int)
+    weights = concatenate([x[1] for x in doc_vectors]) if doc_vectors else asarray([], dtype=float)
+    tf_idf = csr_matrix((weights, term_ids, offsets), shape=(len(doc_ids), int(term_ids.max(initial=-1)) + 1))
+
+    # calculate dot product of every pair of normalised tf-idf vectors
+    dot_products = (tf_idf @ tf_idf.T).toarray()
+    # get factor turning each document's normalised weights back into tf-idf over its term frequency norm
+    scales = vectors.tf_scales(doc_indexes)
+
+    # return cosine
+    return dot_products * outer(scales, scales)
+
+
+########################################################################################################################
+
+
+# calculates pearson's correlation coefficient of every pair of documents, as defined by PortfolioScoring.calc_pxy -
+# term frequencies over the terms both documents share, covariance with n - 1 over standard deviations with n - and
+# 0.0 where it is undefined, pairs sharing fewer than two terms or constant over their shared terms
+def calc_pearson_matrix(tf):
+
+    # presence of every term in every document
+    presence = (tf > 0).astype(float)
+
+    # number of shared terms of every pair
+    n = presence @ presence.T
+    # sum of rq term frequencies over shared terms, and the same for dq
+    rq_sum = tf @ presence.T
+    dq_sum = rq_sum.T
+    # sum of squared rq term frequencies over shared terms, and the same for dq
+    rq_sq_sum = (tf ** 2) @ presence.T
+    dq_sq_sum = rq_sq_sum.T
+    # sum of products of rq and dq term frequencies, non-zero on shared terms only
+    rq_dq_sum = tf @ tf.T
+
+    # n^2 times covariance and variances - exact for integer term frequencies
+    co_moment = n * rq_dq_sum - rq_sum * dq_sum
+    rq_moment = n * rq_sq_sum - rq_sum ** 2
+    dq_moment = n * dq_sq_sum - dq_sum ** 2
+
+    # pairs whose coefficient is defined - at least two shared terms, neither constant over them
+    defined = (n > 1) & (rq_moment > 0) & (dq_moment > 0)
+    # calculate (n - 1) * n * standard deviation * standard deviation
+    denominator = (n - 1) * sqrt(rq_moment) * sqrt(dq_moment)
+
+    # return covariance / (standard deviation * standard deviation), 0.0 where undefined
+    return divide(n * co_moment, denominator, out=zeros_like(denominator), where=defined)
+
+
+########################################################################################################################
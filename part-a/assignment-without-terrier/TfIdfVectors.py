@@ -0,0 +1,150 @@
+#!/usr/bin/python
+
+########################################################################################################################
+
+# Tf-idf vectors of the collection - every document's tf-idf weights divided by its tf-idf norm, laid out like the
+# document store's term frequencies (CSR), together with every document's raw term frequency and tf-idf L2 norms,
+# computed once and persisted next to the collection as '<collection file>.tfidf.npz'
+
+########################################################################################################################
+
+
+# python packages
+from numpy import load, savez
+from numpy import arange, bincount, concatenate, diff, divide, repeat, searchsorted, sqrt, zeros_like, float64
+
+# local packages
+from FileCache import cache_file_path, get_cached
+
+
+########################################################################################################################
+
+
+# tf-idf vectors object
+class TfIdfVectors(object):
+
+    __slots__ = ('tf_norms', 'tf_idf_norms', 'weights')
+
+    def __init__(self, tf_norms, tf_idf_norms, weights):
+
+        # L2 norm of every document's raw term frequencies, in collection order
+        self.tf_norms = tf_norms
+        # L2 norm of every document's tf-idf weights, in collection order
+        self.tf_idf_norms = tf_idf_norms
+        # normalised tf-idf weights of all documents, back to back, aligned with the document store's term ids
+        self.weights = weights
+
+    # returns term ids and normalised tf-idf weights arrays of a given document index
+    def vector(self, store, doc_index):
+
+        # get start and end of document terms
+        start, end = store.offsets[doc_index], store.offsets[doc_index + 1]
+
+        # return term ids and normalised tf-idf weights views
+        return store.term_ids[start:end], self.weights[start:end]
+
+    # returns, for given document indexes, the factor turning a dot product of normalised tf-idf vectors into a tf-idf
+    # dot product over raw term frequency norms, the cosine as defined by MMRScoring.calc_sim
+    def tf_scales(self, doc_indexes):
+
+        # get norms of documents
+        tf_norms, tf_idf_norms = self.tf_norms[doc_indexes], self.tf_idf_norms[doc_indexes]
+
+        # return tf-idf norm / term frequency norm, 0.0 where a document has no terms
+        return divide(tf_idf_norms, tf_norms, out=zeros_like(tf_idf_norms), where=tf_norms > 0)
+
+
+########################################################################################################################
+
+
+# builds tf-idf vectors of every document of a document store from its collection statistics
+def build_tf_idf_vectors(store, stats):
+
+    # get tf-idf weight of every stored term, by looking up its idf among the ascending statistics term ids
+    term_freqs = store.term_freqs.astype(float64)
+    tf_idf = term_freqs * stats.tf_idf_idf[searchsorted(stats.term_ids, store.term_ids)]
+
+    # get document index of every stored term
+    term_doc_indexes = repeat(arange(store.N), diff(store.offsets))
+    # calculate raw term frequency and tf-idf norm of every document, summing each document's squares in order
+    tf_norms = sqrt(bincount(term_doc_indexes, weights=term_freqs ** 2, minlength=store.N))
+    tf_idf_norms = sqrt(bincount(term_doc_indexes, weights=tf_idf ** 2, minlength=store.N))
+
+    # divide every weight by its document tf-idf norm, leaving documents with zero norm at zero
+    doc_tf_idf_norms = tf_idf_norms[term_doc_indexes]
+    weights = divide(tf_idf, doc_tf_idf_norms, out=zeros_like(tf_idf), where=doc_tf_idf_norms > 0)
+
+    # return tf-idf vectors
+    return TfIdfVectors(tf_norms, tf_idf_norms, weights)
+
+
+########################################################################################################################
+
+
+# selects the tf-idf vectors of given document indexes of a document store, laid out like a store of those documents
+# in that order - as load_doc_subset builds it
+def select_tf_idf_vectors(vectors, store, doc_indexes):
+
+    # get start and end of every document's terms
+    starts, ends = store.offsets[:-1][doc_indexes], store.offsets[1:][doc_indexes]
+    # get normalised tf-idf weights of every document, back to back
+    weights = concatenate([vectors.weights[:0]] + [vectors.weights[x:y]
+                                                   for x, y in zip(starts.tolist(), ends.tolist())])
+
+    # return tf-idf vectors of the documents
+    return TfIdfVectors(vectors.tf_norms[doc_indexes], vectors.tf_idf_norms[doc_indexes], weights)
+
+
+########################################################################################################################
+
+
+# returns path of the tf-idf vectors file of a given collection file
+def vectors_file_path(collection_file):
+
+    # return full collection file path, plus tf-idf vectors extension
+    return cache_file_path(collection_file, '.tfidf.npz')
+
+
+########################################################################################################################
+
+
+# saves tf-idf vectors
+def save_tf_idf_vectors(vectors, output_file):
+
+    # open file
+    with open(output_file, mode='wb') as output_file:
+        # write every array
+        savez(output_file, tf_norms=vectors.tf_norms, tf_idf_norms=vectors.tf_idf_norms, weights=vectors.weights)
+
+
+########################################################################################################################
+
+
+# loads tf-idf vectors
+def load_tf_idf_vectors(input_file):
+
+    # open file
+    with load(input_file) as data:
+        # return tf-idf vectors
+        return TfIdfVectors(data['tf_norms'], data['tf_idf_norms'], data['weights'])
+
+
+########################################################################################################################
+
+
+# returns tf-idf vectors of a collection, loading them if persisted, up to date and laid out like the document store,
+# else computing and persisting them
+def get_tf_idf_vectors(collection_file, store, stats):
+
+    # returns whether persisted tf-idf vectors are laid out like the document store
+    def valid(vectors):
+
+        # return whether number of documents and number of terms match
+        return len(vectors.tf_norms) == store.N and len(vectors.weights) == len(store.term_ids)
+
+    # return tf-idf vectors
+    return get_cached(collection_file, vectors_file_path(collection_file), load_tf_idf_vectors,
+                      lambda: build_tf_idf_vectors(store, stats), save_tf_idf_vectors, valid)
+
+
+########################################################################################################################
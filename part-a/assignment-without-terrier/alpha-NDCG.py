@@ -3,264 +3,178 @@
 ########################################################################################################################
 
 # Ref: https://en.wikipedia.org/wiki/Discounted_cumulative_gain#Normalized_DCG
+# Ref: https://plg.uwaterloo.ca/~gvcormac/novelty.pdf
 
 ########################################################################################################################
 
 
 # python packages
 import argparse
+from os import path
 from math import log2
-from collections import OrderedDict
+
+# local packages
+from QrelsIndex import get_qrels
+from NDCG import load_run
 
 
 ########################################################################################################################
 
 
-# loads results
-def load_results(input_file):
-
-    # list to hold data
-    qid_did = []
-    # list to hold query ids
-    query_ids = []
-
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # split line into tokens
-            tokens = line.strip(' \n').split(' ')
-            # assign first token to query id
-            query_id = tokens[0]
-            # if query id is not in query ids list
-            if query_id not in query_ids:
-                # add query id to query ids list
-                query_ids += [query_id]
-            # convert to int and assign fourth token to document rank
-            doc_rank = int(tokens[3])
-            # if document rank is less than 50
-            if doc_rank < 50:
-                # assign third token to document id
-                doc_id = tokens[2]
-                # concatenate query id and document id and assign to query id document id
-                qid_did_temp = ' '.join([query_id, doc_id])
-                # add temporary query id document id to query id document id list
-                qid_did += [qid_did_temp]
-
-    # return query id document id and query ids lists
-    return qid_did, query_ids
+# returns relevant intents of every judged document of a query - document id -> intents judged with grade 1 or more
+def relevant_intents(doc_intents):
+
+    # return relevant intents, for documents relevant to at least one intent
+    return {doc_id: x for doc_id, x in ((doc_id, [i for i, grade in intents.items() if grade >= 1])
+                                        for doc_id, intents in doc_intents.items()) if x}
+
+
+########################################################################################################################
+
+
+# calculates alpha-dcg gain of every rank of a ranking, down to depth - a document gains (1 - alpha) ^ c for every
+# intent it is relevant to, where c counts the documents above it already relevant to that intent
+def calc_gains(doc_ids, rel_intents, alpha, depth):
+
+    # dictionary to hold intent -> number of documents covering it so far
+    covered = {}
+    # list to hold gain of every rank
+    gains = []
+
+    # for every document id down to depth
+    for doc_id in doc_ids[:depth]:
+        # get relevant intents of document
+        intents = rel_intents.get(doc_id, [])
+        # calculate gain of document, with the coverage of the documents above it
+        gains += [sum([(1 - alpha) ** covered.get(i, 0) for i in intents])]
+        # update coverage of the intents of document
+        for i in intents:
+            covered[i] = covered.get(i, 0) + 1
+
+    # return gains, 0.0 past the end of the ranking
+    return gains + [0.0] * (depth - len(gains))
 
 
 ########################################################################################################################
 
 
-# loads qrels
-def load_qrels(input_file):
-
-    # list to hold document intent
-    doc_int = OrderedDict({})
-    # list to hold document relevance
-    doc_rel = OrderedDict({})
-
-    # open file
-    with open(input_file) as input_file:
-        # for every line in input file
-        for line in input_file:
-            # split line into tokens
-            tokens = line.strip(' \n').split(' ')
-            # assign first token to query id
-            query_id = tokens[0]
-            # assign second token to temporary document intent
-            doc_int_temp = int(tokens[1])
-            # assign third token to document id
-            doc_id = tokens[2]
-            # assign fourth token to temporary document relevance
-            doc_rel_temp = int(tokens[3])
-            # concatenate query id and document id and assign to query id document id
-            qid_did = ' '.join([query_id, doc_id])
-            # add temporary document intent to document intent dictionary
-            doc_int[qid_did] = doc_int_temp
-            # add temporary document relevance to document relevance dictionary
-            doc_rel[qid_did] = doc_rel_temp
-
-    # return document intent and document relevance
-    return doc_int, doc_rel
+# calculates alpha-dcg gain of every rank of the ideal ranking, down to depth, with the standard greedy approximation -
+# every rank takes the judged document with the highest gain given the coverage of the documents above it
+def calc_ideal_gains(rel_intents, alpha, depth):
+
+    # dictionary to hold relevant documents not yet ranked
+    candidates = dict(rel_intents)
+    # dictionary to hold intent -> number of documents covering it so far
+    covered = {}
+    # list to hold gain of every rank
+    gains = []
+
+    # while ranks are left and documents are left
+    while len(gains) < depth and candidates:
+        # variables to hold highest gain and its document id
+        high_gain, high_gain_doc_id = None, None
+        # for every candidate document id and its relevant intents
+        for doc_id, intents in candidates.items():
+            # calculate gain of document
+            gain = sum([(1 - alpha) ** covered.get(i, 0) for i in intents])
+            # if high gain is null or gain is greater than high gain
+            if high_gain is None or gain > high_gain:
+                high_gain, high_gain_doc_id = gain, doc_id
+
+        # rank document with highest gain and update coverage of its intents
+        gains += [high_gain]
+        for i in candidates.pop(high_gain_doc_id):
+            covered[i] = covered.get(i, 0) + 1
+
+    # return gains, 0.0 past the last relevant document
+    return gains + [0.0] * (depth - len(gains))
 
 
 ########################################################################################################################
 
 
-# calculates alpha ndcg
-def calc_alpha_ndcg(results, doc_int, doc_rel, k, alpha, start, end):
+# calculates alpha-ndcg of a query's ranked document ids at every given cutoff, in one pass down to the highest cutoff,
+# given the relevant intents of the query's documents and the gains of its ideal ranking down to that cutoff
+def calc_alpha_ndcg(doc_ids, rel_intents, ideal_gains, alpha, cutoffs):
 
-    # get document relevance scores for document ids between start and end
-    rels = [doc_int.get(results[i]) * ((1 - alpha) ** doc_rel.get(results[i]))
-            if doc_rel.get(results[i]) is not None else 0 for i in range(start, end)]
+    # calculate gains of the ranking
+    gains = calc_gains(doc_ids, rel_intents, alpha, len(ideal_gains))
 
-    # sort relevance scores in descending order and assign to sorted relevance scores
-    sorted_rels = sorted(rels, reverse=True)
+    # lists to hold dcg and idcg at every depth, discounting rank r by log2(r + 1)
+    dcg, idcg = [], []
+    # variables to hold cumulative dcg and idcg
+    cum_dcg, cum_idcg = 0.0, 0.0
+    # for every rank and its gains
+    for r, (gain, ideal_gain) in enumerate(zip(gains, ideal_gains), 1):
+        cum_dcg += gain / log2(r + 1)
+        cum_idcg += ideal_gain / log2(r + 1)
+        dcg += [cum_dcg]
+        idcg += [cum_idcg]
 
-    # assign first relevance score to relevance score 1
-    rel1 = rels[0]
-    # assign first sorted relevance score to sorted relevance score 1
-    sorted_rel1 = sorted_rels[0]
+    # return alpha-ndcg at every cutoff, 0.0 if the query has no relevant documents
+    return [dcg[k - 1] / idcg[k - 1] if idcg[k - 1] > 0 else 0.0 for k in cutoffs]
 
-    # calculate dcg fraction
-    dcg_fraction = sum([(rels[i] / log2(i + 1)) for i in range(1, k)])
-    # calculate idcg fraction
-    idcg_fraction = sum([(sorted_rels[i] / log2(i + 1)) for i in range(1, k)])
 
-    # calculate dcg
-    dcg = rel1 + dcg_fraction
-    # calculate idcg
-    idcg = sorted_rel1 + idcg_fraction
+########################################################################################################################
+
 
-    # set alpha ndcg to 0.0
-    alpha_ndcg = 0.0
+# calculates average alpha-ndcg of a run at every alpha and every cutoff, each (alpha, cutoff) with its own sum - ideal
+# holds (query id, alpha) -> (relevant intents, ideal gains), filled on first use and shared by every run
+def calc_avg_alpha_ndcg(run, qrels, alphas, cutoffs, ideal):
 
-    # if dcg and idcg are not equal to 0 or 0.0
-    if dcg and idcg != 0 or 0.0:
-        # calculate alpha-ndcg
-        alpha_ndcg = dcg / idcg
+    # list to hold, for every alpha, alpha-ndcg at every cutoff
+    all_alpha_ndcg = [[0.0 for _ in cutoffs] for _ in alphas]
 
-    # return alpha ndcg
-    return alpha_ndcg
+    # for every query id and ranked document ids
+    for query_id, doc_ids in run:
+        # for every alpha and its sums
+        for i, alpha in enumerate(alphas):
+            # if ideal ranking of query and alpha is not calculated yet
+            if (query_id, alpha) not in ideal:
+                # get relevant intents of every judged document and calculate gains of the ideal ranking
+                rel_intents = relevant_intents(qrels.query_intents(query_id))
+                ideal[(query_id, alpha)] = (rel_intents, calc_ideal_gains(rel_intents, alpha, max(cutoffs)))
+            # get relevant intents and ideal gains
+            rel_intents, ideal_gains = ideal[(query_id, alpha)]
+            # calculate alpha-ndcg at every cutoff and add it to the sums of alpha
+            alpha_ndcg = calc_alpha_ndcg(doc_ids, rel_intents, ideal_gains, alpha, cutoffs)
+            all_alpha_ndcg[i] = [x + y for x, y in zip(all_alpha_ndcg[i], alpha_ndcg)]
+
+    # return average alpha-ndcg at every alpha and cutoff
+    return [[x / len(run) for x in alpha_ndcg] for alpha_ndcg in all_alpha_ndcg]
 
 
 ########################################################################################################################
 
 
 # main function
-def main(model_value):
-
-    # split parameter on '_'
-    tokens = model_value.split('_')
-    # assign first token to model
-    model = tokens[0]
-    # assign second token to value
-    value = tokens[1]
-
-    # variable to hold param set to null
-    param = None
-    # variable to hold results set to null
-    results = None
-    # variable to hold query ids set to null
-    query_ids = None
-
-    # if model is equal to mmr
-    if model == 'mmr':
-        # set param to 'lambda'
-        param = 'lambda'
-        # if value is equal to '0.25'
-        if value == '0.25':
-            # load corresponding results
-            results, query_ids = load_results('output/final/question-3/mmr_lambda_0.25.txt')
-        # if value is equal to '0.50'
-        elif value == '0.50':
-            # load corresponding results
-            results, query_ids = load_results('output/final/question-3/mmr_lambda_0.50.txt')
-    # if model is equal to portfolio
-    elif model == 'portfolio':
-        # set param to 'b'
-        param = 'b'
-        # if value is equal to '-4'
-        if value == '-4':
-            # load corresponding results
-            results, query_ids = load_results('output/final/question-4/portfolio_b_-4.txt')
-        # if value is equal to '4'
-        elif value == '4':
-            # load corresponding results
-            results, query_ids = load_results('output/final/question-4/portfolio_b_4.txt')
-
-    # load qrels
-    doc_int, doc_rel = load_qrels('input/qrels.ndeval.txt')
-
-    # assign length of query ids to query ids length
-    query_ids_len = len(query_ids)
-    # list to hold alpha-ndcg at k in (1, 5, 10, 20, 30, 40, 50)
-    all_alpha_ndcg = [0.0 for _ in range(7)]
-
-    # variable to hold file path set to null
-    file_path = None
-
-    # loop for alpha in (0.1, 0.5, 0.9)
-    for alpha in (0.1, 0.5, 0.9):
-        # for every query id
-        for query_id in query_ids:
-            # convert query id to int and assign to query id
-            query_id = int(query_id)
-            # convert first query id to int and assign to query id 1
-            query_id1 = int(query_ids[0])
-
-            # loop from 0 to 1, 5, 10, 20, 30, 40, 50
-            for k in (1, 5, 10, 20, 30, 40, 50):
-                # set i to 0
-                i = 0
-                # if k equals 1, i equals 0
-                if k == 1:
-                    i = 0
-                # else if k equals 5, i equals 1
-                elif k == 5:
-                    i = 1
-                # else if k equals 10, i equals 2
-                elif k == 10:
-                    i = 2
-                # else if k equals 20, i equals 3
-                elif k == 20:
-                    i = 3
-                # else if k equals 30, i equals 4
-                elif k == 30:
-                    i = 4
-                # else if k equals 40, i equals 5
-                elif k == 40:
-                    i = 5
-                # else if k equals 50, i equals 6
-                elif k == 50:
-                    i = 6
-
-                # set start value
-                start = 50 * (query_id - query_id1)
-                # set end value
-                end = start + k
-
-                # calculate alpha-ndcg and return output in alpha ndcg
-                alpha_ndcg = calc_alpha_ndcg(results, doc_int, doc_rel, k, alpha, start, end)
-                # add alpha ndcg to all alpha ndcg
-                all_alpha_ndcg[i] += alpha_ndcg
-
-        # calculate average alpha-ndcg @ k = 1
-        avg_alpha_ndcg_k1 = all_alpha_ndcg[0] / query_ids_len
-        # calculate average alpha-ndcg @ k = 5
-        avg_alpha_ndcg_k5 = all_alpha_ndcg[1] / query_ids_len
-        # calculate average alpha-ndcg @ k = 10
-        avg_alpha_ndcg_k10 = all_alpha_ndcg[2] / query_ids_len
-        # calculate average alpha-ndcg @ k = 20
-        avg_alpha_ndcg_k20 = all_alpha_ndcg[3] / query_ids_len
-        # calculate average alpha-ndcg @ k = 30
-        avg_alpha_ndcg_k30 = all_alpha_ndcg[4] / query_ids_len
-        # calculate average alpha-ndcg @ k = 40
-        avg_alpha_ndcg_k40 = all_alpha_ndcg[5] / query_ids_len
-        # calculate average alpha-ndcg @ k = 50
-        avg_alpha_ndcg_k50 = all_alpha_ndcg[6] / query_ids_len
-
-        # write alpha ndcg @ k in (1, 5, 10, 20, 30, 40, 50) to file
-        with open('output/temp/{}_{}_{}_ndcg.txt'.format(model, param, value), mode='a') as results_file:
-            results_file.write('{}\n'.format(model))
-            results_file.write('{} = {}\n'.format(param, value))
-            results_file.write('alpha\t|\tK\t|\talpha-NDCG@K\n')
-            results_file.write('{:.1f}\t|\t1\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k1))
-            results_file.write('{:.1f}\t|\t5\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k5))
-            results_file.write('{:.1f}\t|\t10\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k10))
-            results_file.write('{:.1f}\t|\t20\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k20))
-            results_file.write('{:.1f}\t|\t30\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k30))
-            results_file.write('{:.1f}\t|\t40\t|\t{:.3f}\n'.format(alpha, avg_alpha_ndcg_k40))
-            results_file.write('{:.1f}\t|\t50\t|\t{:.3f}\n\n'.format(alpha, avg_alpha_ndcg_k50))
-
-            # assign results file name to file path
-            file_path = results_file.name
-
+def main(run_files, qrels_file, alphas, cutoffs, output_file):
+
+    # load qrels index once, for every run
+    qrels = get_qrels(qrels_file)
+    # dictionary to hold ideal ranking of every query and alpha, shared by every run
+    ideal = {}
+
+    # list to hold (run name, alpha, average alpha-ndcg at every cutoff)
+    report = []
+    # for every run file
+    for run_file in run_files:
+        # load run, grouped by query id
+        run = list(load_run(run_file).items())
+        # get run name, the file name without extension
+        run_name = path.splitext(path.basename(run_file))[0]
+        # calculate average alpha-ndcg at every alpha and cutoff
+        for alpha, avg_alpha_ndcg in zip(alphas, calc_avg_alpha_ndcg(run, qrels, alphas, cutoffs, ideal)):
+            report += [(run_name, alpha, avg_alpha_ndcg)]
+
+    # write alpha-ndcg @ k of every run and alpha to file
+    with open(output_file, mode='w') as results_file:
+        results_file.write('run\t|\talpha\t|\t{}\n'.format('\t|\t'.join('alpha-NDCG@{}'.format(k) for k in cutoffs)))
+        for run_name, alpha, avg_alpha_ndcg in report:
+            results_file.write('{}\t|\t{}\t|\t{}\n'.format(run_name, alpha,
+                                                           '\t|\t'.join('{:.3f}'.format(x) for x in avg_alpha_ndcg)))
     # print progress
-    print('\nSaved results to file at path: \'{}\'\n'.format(file_path))
+    print('\nSaved results to file at path: \'{}\'\n'.format(results_file.name))
 
 
 ########################################################################################################################
@@ -269,14 +183,27 @@ def main(model_value):
 # runs main function
 if __name__ == '__main__':
 
-    # parse script argument
+    # parse script arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('-mv', '--model_value', type=str, dest='model_value', metavar='model value',
-                        help='model value', required=True)
+    parser.add_argument('-r', '--runs', type=str, nargs='+', dest='runs_', metavar='run file',
+                        default=['output/final/question-3/mmr_lambda_0.25.txt',
+                                 'output/final/question-3/mmr_lambda_0.50.txt',
+                                 'output/final/question-4/portfolio_b_-4.txt',
+                                 'output/final/question-4/portfolio_b_4.txt'],
+                        help='run files in standard TREC format')
+    parser.add_argument('-q', '--qrels', type=str, dest='qrels_', metavar='qrels file',
+                        default='input/qrels.ndeval.txt', help='subtopic qrels file')
+    parser.add_argument('-a', '--alphas', type=lambda x: [float(y) for y in x.split(',')], dest='alphas_',
+                        metavar='alpha values', default=[0.1, 0.5, 0.9], help='comma separated alpha values')
+    parser.add_argument('--cutoffs', type=lambda x: [int(y) for y in x.split(',')], dest='cutoffs_',
+                        metavar='alpha-ndcg cutoffs', default=[1, 5, 10, 20, 30, 40, 50],
+                        help='comma separated alpha-ndcg cutoffs')
+    parser.add_argument('-o', '--output', type=str, dest='output_', metavar='output file',
+                        default='output/temp/alpha_ndcg.txt', help='alpha-ndcg results file')
     args = parser.parse_args()
 
-    # call main function with the script argument as parameter
-    main(args.model_value)
+    # call main function with the script arguments as parameters
+    main(args.runs_, args.qrels_, args.alphas_, args.cutoffs_, args.output_)
 
 
 ########################################################################################################################